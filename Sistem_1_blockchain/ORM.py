@@ -1,10 +1,73 @@
 import enum
+import os
+import threading
+import time
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.exc import TimeoutError
+from sqlalchemy.pool import QueuePool
 
 
 
 db = SQLAlchemy()  # instanca ORM-a
 
+
+class TimedQueuePool(QueuePool):
+    """QueuePool koji broji checkout-e i meri koliko se čekalo na konekciju."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats_lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except TimeoutError:
+            with self.stats_lock:
+                self.timeouts += 1
+            raise
+        finally:
+            waited = time.perf_counter() - start
+            with self.stats_lock:
+                self.checkouts += 1
+                self.wait_total += waited
+                self.wait_max = max(self.wait_max, waited)
+
+    def stats(self):
+        with self.stats_lock:
+            return {
+                "size": self.size(),
+                "checked_in": self.checkedin(),
+                "checked_out": self.checkedout(),
+                "overflow": self.overflow(),
+                "max_overflow": self._max_overflow,
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "wait_avg_ms": self.wait_total / self.checkouts * 1000 if self.checkouts else 0.0,
+                "wait_max_ms": self.wait_max * 1000
+            }
+
+
+def engine_options():
+    # Podešavanja bazena konekcija iz okruženja; recycle mora biti manji od MySQL wait_timeout
+    return {
+        "poolclass": TimedQueuePool,
+        "pool_size": int(os.getenv("DB_POOL_SIZE", "10")),
+        "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "20")),
+        "pool_timeout": float(os.getenv("DB_POOL_TIMEOUT", "10")),
+        "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", "280")),
+        "pool_pre_ping": os.getenv("DB_POOL_PRE_PING", "1") == "1"
+    }
+
+
+def pool_stats():
+    return db.engine.pool.stats()
+
+
 class UserRole(enum.Enum):
     owner = "owner"
     customer = "customer"
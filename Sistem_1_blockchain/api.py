@@ -1,6 +1,6 @@
 import os
 from flask import Flask, request, jsonify
-from ORM import User, UserRole, db
+from ORM import User, UserRole, db, engine_options, pool_stats
 import re
 from JWT import JWT
 # from dotenv import load_dotenv
@@ -16,6 +16,7 @@ db_addr = os.getenv('DB_ADDR')
 db_port = os.getenv('DB_PORT')
 app.config['SQLALCHEMY_DATABASE_URI'] = f"mysql+pymysql://{db_user}:{db_pass}@{db_addr}/korisnici"
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options()
 
 db.init_app(app)
 
@@ -127,5 +128,11 @@ def delete():
     return '', 200
 
 
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    # Stanje bazena konekcija, za podešavanje veličine prema broju radnika
+    return jsonify({"db_pool": pool_stats()}), 200
+
+
 if __name__ == '__main__':
     app.run(host="0.0.0.0", port=5000, debug=True)
\ No newline at end of file
@@ -0,0 +1,86 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUCache:
+    """Ograničen keš sa LRU izbacivanjem i brojačima pogodaka/promašaja, bezbedan za niti."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_create(self, key, factory):
+        value = self.get(key)
+        if value is None:
+            value = factory()
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        with self.lock:
+            return {
+                "size": len(self.entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions
+            }
+
+
+class TTLCache(LRUCache):
+    """LRUCache čije stavke ističu ttl sekundi posle upisa."""
+
+    def __init__(self, maxsize, ttl):
+        super().__init__(maxsize)
+        self.ttl = ttl
+        self.expired = 0
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                value, expires = entry
+                if expires > time.monotonic():
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self.entries[key]
+                self.expired += 1
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        super().put(key, (value, time.monotonic() + self.ttl))
+
+    def stats(self):
+        stats = super().stats()
+        with self.lock:
+            stats["ttl"] = self.ttl
+            stats["expired"] = self.expired
+        return stats
@@ -6,11 +6,12 @@ from flask import Flask, request, jsonify, g
 from sqlalchemy import func, case
 from dotenv import load_dotenv
 from sqlalchemy.exc import IntegrityError
-from ORM import db, Product, Category, ProductCategory, Order, OrderProduct
+from ORM import db, db_ready, engine_options, pool_stats, read_replica, Product, Category, ProductCategory, Order, OrderProduct, ProductSales
 from JWT import JWT
 import jwt
 
-from blockchain import OrderContract
+from blockchain import OrderContract, ChainBreaker, ChainUnavailable, ReceiptTracker
+from pagination import Pagination
 
 load_dotenv()
 
@@ -23,7 +24,15 @@ db_name = "prodavnica"
 DB_URI  = f"mysql+pymysql://{db_user}:{db_pass}@{db_addr}/{db_name}"
 
 app.config["SQLALCHEMY_DATABASE_URI"] = DB_URI
+
+# Opciona replika za rute koje samo čitaju (read_replica)
+db_replica_addr = os.getenv("DB_REPLICA_ADDR", "")
+if db_replica_addr:
+    app.config["SQLALCHEMY_BINDS"] = {
+        "replica": f"mysql+pymysql://{db_user}:{db_pass}@{db_replica_addr}/{db_name}"
+    }
 app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options()
 
 db.init_app(app)
 
@@ -64,21 +73,51 @@ def auth_check(required_role: str | None = None):
 
 
 @app.route("/orders_to_deliver", methods=["GET"])
+@read_replica
 def orders_to_deliver():
     ok, val = auth_check(required_role="courier")
     if not ok:
         return val
 
-    q = (
-        db.session.query(
-            Order.id, Order.email
-        ).filter(Order.status == "CREATED").order_by(Order.id)
-    )
-
-    orders = []
-    for id, email in q.all():
-        orders.append({"id": id, "email": email})
-
+    ok, after = Pagination.decode_cursor(request.args, 1)
+    if not ok or (after is not None and not isinstance(after[0], int)):
+        return jsonify({"message": "Invalid cursor."}), 400
+
+    def page(after_id, limit):
+        q = (
+            db.session.query(
+                Order.id, Order.email
+            ).filter(Order.status == "CREATED", Order.deploy_status == "DEPLOYED")
+        )
+        if after_id is not None:
+            q = q.filter(Order.id > after_id)
+        q = q.order_by(Order.id)
+        if limit is not None:
+            q = q.limit(limit)
+        return [{"id": id, "email": email} for id, email in q.all()]
+
+    # stream=1: sve narudžbine za dostavu se šalju deo po deo
+    if Pagination.streamed(request.args):
+        def chunks(after_id):
+            while True:
+                orders = page(after_id, Pagination.stream_chunk)
+                if not orders:
+                    return
+                yield orders
+                after_id = orders[-1]["id"]
+                if len(orders) < Pagination.stream_chunk:
+                    return
+        return Pagination.stream("orders", chunks(after[0] if after else None))
+
+    if Pagination.requested(request.args):
+        limit = Pagination.parse_limit(request.args)
+        if limit is None:
+            return jsonify({"message": "Invalid limit."}), 400
+        orders = page(after[0] if after else None, limit + 1)
+        next_cursor = Pagination.encode_cursor([orders[limit - 1]["id"]]) if len(orders) > limit else None
+        return jsonify({"orders": orders[:limit], "next_cursor": next_cursor}), 200
+
+    orders = page(None, None)
     return jsonify({"orders": orders}), 200
 
 
@@ -106,23 +145,54 @@ def pick_up_order():
 
     #Ukoliko u bazi ne postoji porudzbina sa ovim id-jem koja je statusa "CREATED"
     order = db.session.get(Order, order_id)
-    if not order or order.status != "CREATED":
+    if not order or order.status != "CREATED" or order.deploy_status == "FAILED":
         return jsonify({"message": "Invalid order id."}), 400
+    if order.deploy_status == "DEPLOYING":
+        return jsonify({"message": "Order contract is still deploying."}), 400
 
     #Ukoliko nedostaje polje address
     if "address" not in data or data["address"] == "":
         return jsonify({"message": "Missing address."}), 400
 
     #Dodeljujemo kurira pametnom ugovoru
-    assigned = OrderContract.assign_courier(order.contract_address, data["address"])
+    chain = OrderContract.for_mode(order.contract_mode)
+    assigned = chain.assign_courier(order.contract_address, data["address"], order_id=order.id)
+    if assigned.get("submitted"):
+        # Transakcija je poslata ali potvrda nije stigla na vreme; status pomera indekser
+        return jsonify({"message": "Courier assignment submitted.", "tx_hash": assigned["message"]}), 202
     if not assigned["success"]:
         return jsonify({"message": assigned["message"]}), 400
 
-    #Radimo update statusa u bazi na "PENDING"
-    order.status = "PENDING"
+    #Radimo update statusa u bazi na "PENDING", zajedno sa zbirom za /product_statistics
+    ProductSales.move(order.id, "CREATED", "PENDING")
     db.session.commit()
 
     return "", 200
 
+
+@app.errorhandler(ChainUnavailable)
+def chain_unavailable(e):
+    # Prekidač je otvoren ili je istekao rok operacije: brz odgovor umesto visećeg radnika
+    return jsonify({"message": str(e)}), 503
+
+
+@app.route("/ready", methods=["GET"])
+def ready():
+    # Spremnost servisa: dostupnost baze i blockchain čvora
+    checks = {"db": db_ready(), "node": OrderContract.node_ready()}
+    ok = all(checks.values())
+    return jsonify({"ready": ok, **checks}), 200 if ok else 503
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    return jsonify({
+        "chain_breaker": ChainBreaker.stats(),
+        "db_pool": pool_stats(),
+        "receipts_pending": ReceiptTracker.pending_count(),
+        "caches": OrderContract.cache_stats()
+    }), 200
+
+
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=5003, debug=True)
@@ -0,0 +1,70 @@
+import base64
+import binascii
+import json
+import os
+
+from flask import Response, stream_with_context
+
+
+class Pagination:
+    """
+    Keyset (cursor) straničenje: kursor je base64 zapis ključa poslednje vraćene
+    stavke, pa sledeća stranica kreće od indeksa umesto preskakanja (OFFSET).
+    Straničenje je opciono (limit/cursor parametri), bez njih rute vraćaju sve.
+    """
+    default_limit = int(os.getenv("PAGE_SIZE", "50"))
+    max_limit = int(os.getenv("MAX_PAGE_SIZE", "500"))
+    stream_chunk = int(os.getenv("STREAM_CHUNK_SIZE", "200"))
+
+    @staticmethod
+    def requested(args):
+        return "limit" in args or "cursor" in args
+
+    @staticmethod
+    def streamed(args):
+        return args.get("stream", "") in ("1", "true")
+
+    @staticmethod
+    def parse_limit(args):
+        # None ako limit nije ceo broj u opsegu 1..max_limit
+        value = args.get("limit")
+        if value is None:
+            return Pagination.default_limit
+        try:
+            limit = int(value)
+        except ValueError:
+            return None
+        if limit <= 0 or limit > Pagination.max_limit:
+            return None
+        return limit
+
+    @staticmethod
+    def encode_cursor(key):
+        return base64.urlsafe_b64encode(json.dumps(key).encode()).decode()
+
+    @staticmethod
+    def decode_cursor(args, size):
+        # (True, None) bez kursora, (True, ključ) za ispravan, (False, None) za neispravan
+        cursor = args.get("cursor")
+        if not cursor:
+            return True, None
+        try:
+            key = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        except (binascii.Error, ValueError, UnicodeDecodeError):
+            return False, None
+        if not isinstance(key, list) or len(key) != size:
+            return False, None
+        return True, key
+
+    @staticmethod
+    def stream(field, chunks):
+        # Odgovor {"<field>": [...]} se šalje deo po deo, chunks daje liste već serijalizovanih stavki
+        def generate():
+            yield '{"%s": [' % field
+            first = True
+            for chunk in chunks:
+                for item in chunk:
+                    yield ("" if first else ", ") + json.dumps(item)
+                    first = False
+            yield "]}"
+        return Response(stream_with_context(generate()), mimetype="application/json")
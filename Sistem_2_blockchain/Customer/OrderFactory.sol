@@ -0,0 +1,95 @@
+// SPDX-License-Identifier: MIT
+pragma solidity ^0.8.0;
+
+// Implementacija ugovora narudžbine za EIP-1167 klonove: umesto konstruktora
+// koristi initialize, a ABI je isti kao kod OrderContract iz Contract.json.
+contract OrderContractImpl {
+    address public owner;
+    address public customer;
+    address public courier;
+    uint256 public price;
+    bool public paid;
+    bool public delivered;
+    bool private initialized;
+
+    event Paid(address indexed customer, uint256 amount);
+    event CourierAssigned(address indexed courier);
+    event DeliveryConfirmed(address indexed customer, uint256 ownerShare, uint256 courierShare);
+
+    modifier onlyOwner() {
+        require(msg.sender == owner, "Only owner.");
+        _;
+    }
+
+    constructor() {
+        // sama implementacija se nikada ne inicijalizuje
+        initialized = true;
+    }
+
+    function initialize(address _owner, address _customer, uint256 _price) external {
+        require(!initialized, "Already initialized.");
+        initialized = true;
+        owner = _owner;
+        customer = _customer;
+        price = _price;
+    }
+
+    function pay() external payable {
+        require(msg.sender == customer, "Only customer.");
+        require(!paid, "Transfer already complete.");
+        require(msg.value == price, "Incorrect amount.");
+        paid = true;
+        emit Paid(msg.sender, msg.value);
+    }
+
+    function assignCourier(address _courier) external onlyOwner {
+        require(paid, "Transfer not complete.");
+        require(courier == address(0), "Courier already assigned.");
+        courier = _courier;
+        emit CourierAssigned(_courier);
+    }
+
+    function confirmDelivery() external onlyOwner {
+        require(courier != address(0), "Delivery not complete.");
+        require(!delivered, "Delivery already confirmed.");
+        delivered = true;
+
+        uint256 ownerShare = (price * 80) / 100;
+        uint256 courierShare = price - ownerShare;
+        payable(owner).transfer(ownerShare);
+        payable(courier).transfer(courierShare);
+        emit DeliveryConfirmed(customer, ownerShare, courierShare);
+    }
+}
+
+// Deploy-uje implementaciju jednom, a svaku narudžbinu pravi kao minimalni proxy.
+contract OrderFactory {
+    address public owner;
+    address public implementation;
+
+    event OrderCreated(address indexed order, address indexed customer, uint256 price);
+
+    constructor() {
+        owner = msg.sender;
+        implementation = address(new OrderContractImpl());
+    }
+
+    function createOrder(address customer, uint256 price) external returns (address order) {
+        require(msg.sender == owner, "Only owner.");
+        order = clone(implementation);
+        OrderContractImpl(order).initialize(owner, customer, price);
+        emit OrderCreated(order, customer, price);
+    }
+
+    function clone(address target) internal returns (address instance) {
+        // EIP-1167: init kod + runtime koji delegatecall-om prosleđuje sve pozive na target
+        assembly {
+            let ptr := mload(0x40)
+            mstore(ptr, 0x3d602d80600a3d3981f3363d3d373d3d3d363d73000000000000000000000000)
+            mstore(add(ptr, 0x14), shl(0x60, target))
+            mstore(add(ptr, 0x28), 0x5af43d82803e903d91602b57fd5bf30000000000000000000000000000000000)
+            instance := create(0, ptr, 0x37)
+        }
+        require(instance != address(0), "Clone failed.");
+    }
+}
@@ -0,0 +1,44 @@
+import os
+import sys
+import time
+
+# Benchmark ne koristi bazu: nonce se vodi u memoriji, a pomoćni ugovori
+# (OrderFactory, OrderBook) se deploy-uju direktno
+os.environ.setdefault("NONCE_STORE", "local")
+
+from blockchain import OrderContract, OrderClone, OrderBook, ReceiptTracker, load_artifact
+
+
+def measure(chain, customer_address, count, first_order_id):
+    gas = []
+    latency = []
+    for i in range(count):
+        start = time.perf_counter()
+        sent = chain.send_deploy(customer_address, 10, first_order_id + i)
+        receipt = ReceiptTracker.wait(sent["message"])
+        latency.append(time.perf_counter() - start)
+        gas.append(receipt.gasUsed)
+    return sum(gas) / count, sum(latency) / count * 1000
+
+
+def bench(count):
+    w3 = OrderContract.w3
+    customer_address = w3.eth.accounts[0]
+
+    factory = OrderContract.deploy_artifact(load_artifact("OrderFactory"), 3000000)
+    OrderClone.address = factory.contractAddress
+    book = OrderContract.deploy_artifact(load_artifact("OrderBook"), 2000000)
+    OrderBook.address = book.contractAddress
+
+    print(f"One-time OrderFactory deploy gas: {factory.gasUsed}")
+    print(f"One-time OrderBook deploy gas:    {book.gasUsed}")
+    print(f"{'mode':<10} {'avg gas':>12} {'avg latency ms':>16}")
+
+    first_order_id = int(time.time()) * 1000
+    for mode in ("PER_ORDER", "CLONE", "REGISTRY"):
+        avg_gas, avg_ms = measure(OrderContract.for_mode(mode), customer_address, count, first_order_id)
+        print(f"{mode:<10} {avg_gas:>12.0f} {avg_ms:>16.1f}")
+
+
+if __name__ == "__main__":
+    bench(int(sys.argv[1]) if len(sys.argv) > 1 else 20)
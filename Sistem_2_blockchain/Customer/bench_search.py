@@ -0,0 +1,119 @@
+import os
+import random
+import sys
+import time
+
+from sqlalchemy import insert, select, delete, func
+from sqlalchemy.engine import make_url
+
+# benchmark ne nastavlja deploy-e i ne gradi indeks pri importu customer modula
+os.environ.setdefault("BACKGROUND_JOBS", "0")
+
+# Benchmark puni bazu sintetičkim proizvodima, pa radi samo nad posebnom bazom
+# (BENCH_DATABASE_URI), nikad nad bazom aplikacije
+BENCH_URI = os.getenv("BENCH_DATABASE_URI", "")
+if not BENCH_URI:
+    sys.exit("Set BENCH_DATABASE_URI to a separate benchmark database.")
+
+import ORM
+
+# customer.py pravi engine pri importu, pa se URI menja pre toga (kao u testovima)
+init_app = ORM.db.init_app
+
+
+def bench_init_app(flask_app):
+    flask_app.config["SQLALCHEMY_DATABASE_URI"] = BENCH_URI
+    flask_app.config.pop("SQLALCHEMY_BINDS", None)
+    init_app(flask_app)
+
+
+ORM.db.init_app = bench_init_app
+try:
+    import customer
+finally:
+    ORM.db.init_app = init_app
+
+if make_url(BENCH_URI).database in (None, "", customer.db_name):
+    sys.exit(f"BENCH_DATABASE_URI must name a database other than {customer.db_name}.")
+
+from customer import app, search_sql
+from ORM import db, Product, Category, ProductCategory
+from search_index import SearchIndex
+
+WORDS = ["apple", "banana", "cherry", "grape", "lemon", "mango", "melon", "orange", "peach", "pear",
+         "plum", "berry", "juice", "bread", "cheese", "butter", "milk", "honey", "salt", "sugar"]
+QUERIES = [("", ""), ("app", ""), ("berry", "fruit"), ("an", ""), ("zzz", ""), ("", "cat-1"), ("juice-9", "")]
+
+
+def seed(count):
+    # Katalog se dopunjuje sintetičkim proizvodima (bench-*) do zadatog broja; vraća
+    # ukupan broj proizvoda, prvi dodati id i dodate kategorije, za cleanup
+    existing = db.session.execute(select(func.count(Product.id))).scalar_one()
+    if existing >= count:
+        return existing, None, []
+
+    categories = [f"bench-cat-{i}" for i in range(50)] + ["bench-fruit"]
+    known = set(db.session.execute(select(Category.name).where(Category.name.in_(categories))).scalars())
+    created = [name for name in categories if name not in known]
+    if created:
+        db.session.execute(insert(Category), [{"name": name} for name in created])
+    category_names = dict(db.session.execute(select(Category.id, Category.name).where(Category.name.in_(categories))).all())
+
+    start = db.session.execute(select(func.coalesce(func.max(Product.id), 0))).scalar_one() + 1
+    for chunk_start in range(0, count - existing, 5000):
+        rows = []
+        links = []
+        for i in range(chunk_start, min(chunk_start + 5000, count - existing)):
+            product_id = start + i
+            name = f"bench-{random.choice(WORDS)}-{random.choice(WORDS)}-{product_id}"
+            picked = random.sample(list(category_names), 2)
+            rows.append({
+                "id": product_id, "name": name, "price": random.randint(1, 1000),
+                "category_names": sorted(category_names[category_id] for category_id in picked)
+            })
+            for category_id in picked:
+                links.append({"product_id": product_id, "category_id": category_id})
+        db.session.execute(insert(Product), rows)
+        db.session.execute(insert(ProductCategory), links)
+        db.session.commit()
+    return count, start, created
+
+
+def cleanup(first_id, created):
+    # Briše samo ono što je seed dodao, katalog ostaje kakav je bio pre merenja
+    if first_id is not None:
+        seeded = select(Product.id).where(Product.id >= first_id, Product.name.like("bench-%"))
+        db.session.execute(delete(ProductCategory).where(ProductCategory.product_id.in_(seeded)))
+        db.session.execute(delete(Product).where(Product.id >= first_id, Product.name.like("bench-%")))
+    if created:
+        db.session.execute(delete(Category).where(Category.name.in_(created)))
+    db.session.commit()
+
+
+def timed(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - start) / repeat * 1000, result
+
+
+def bench(count, repeat):
+    with app.app_context():
+        db.create_all()
+        total, first_id, created = seed(count)
+        try:
+            build_ms, _ = timed(SearchIndex.refresh, 1)
+            print(f"Products: {total}, index build: {build_ms:.0f} ms")
+            print(f"{'name':<10} {'category':<10} {'sql ms':>10} {'index ms':>10} {'results':>8} {'same':>5}")
+            for name_q, cat_q in QUERIES:
+                sql_ms, sql_result = timed(lambda: search_sql(name_q, cat_q), repeat)
+                index_ms, index_result = timed(lambda: SearchIndex.search(name_q, cat_q), repeat)
+                same = sql_result[1] == index_result[1] and sorted(sql_result[0]) == sorted(index_result[0])
+                print(f"{name_q:<10} {cat_q:<10} {sql_ms:>10.1f} {index_ms:>10.1f} {len(index_result[1]):>8} {str(same):>5}")
+        finally:
+            db.session.rollback()
+            cleanup(first_id, created)
+
+
+if __name__ == "__main__":
+    bench(int(sys.argv[1]) if len(sys.argv) > 1 else 100000, int(sys.argv[2]) if len(sys.argv) > 2 else 3)
@@ -3,10 +3,15 @@ from decimal import Decimal
 from datetime import datetime, timezone
 from functools import wraps
 from flask import Flask, request, jsonify, g
-from sqlalchemy import func
+from sqlalchemy import func, or_, and_, insert
+from sqlalchemy.orm import selectinload
 from dotenv import load_dotenv
-from blockchain import OrderContract
-from ORM import db, Product, Category, ProductCategory, Order, OrderProduct
+from blockchain import OrderContract, ChainBreaker, ChainUnavailable, ReceiptTracker
+from deployer import ContractDeployer
+from pagination import Pagination
+from search_index import SearchIndex, SearchCache
+from idempotency import Idempotency
+from ORM import db, db_ready, engine_options, pool_stats, read_replica, Replica, Product, Category, ProductCategory, Order, OrderProduct, ProductSales, CatalogVersion
 from JWT import JWT
 import jwt
 
@@ -21,9 +26,18 @@ db_name = "prodavnica"
 DB_URI  = f"mysql+pymysql://{db_user}:{db_pass}@{db_addr}/{db_name}"
 
 app.config["SQLALCHEMY_DATABASE_URI"] = DB_URI
+
+# Opciona replika za rute koje samo čitaju (read_replica)
+db_replica_addr = os.getenv("DB_REPLICA_ADDR", "")
+if db_replica_addr:
+    app.config["SQLALCHEMY_BINDS"] = {
+        "replica": f"mysql+pymysql://{db_user}:{db_pass}@{db_replica_addr}/{db_name}"
+    }
 app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options()
 
 db.init_app(app)
+ContractDeployer.init_app(app)
 
 
 def is_positive_int(val):
@@ -66,15 +80,8 @@ def auth_check(required_role: str | None = None):
 
     return True, {"email": email, "role": role}
 
-@app.route("/search", methods=["GET"])
-def search():
-    ok, val = auth_check(required_role="customer")
-    if not ok:
-        return val
-
-    name_q = request.args.get("name", "", type=str)
-    cat_q  = request.args.get("category", "", type=str)
 
+def search_sql(name_q, cat_q):
     name_like = f"%{name_q}%"
     cat_like  = f"%{cat_q}%"
 
@@ -104,16 +111,39 @@ def search():
 
     out_products = []
     for p in products:
-        cat_names = [c.name for c in p.categories]
-        cat_names.sort()
         out_products.append({
-            "categories": cat_names,
+            "categories": p.category_names or [],
             "id": p.id,
             "name": p.name,
             "price": float(p.price) if p.price is not None else 0.0
         })
 
-    return jsonify({"categories": categories, "products": out_products}), 200
+    return categories, out_products
+
+
+@app.route("/search", methods=["GET"])
+@read_replica
+def search():
+    ok, val = auth_check(required_role="customer")
+    if not ok:
+        return val
+
+    name_q = request.args.get("name", "", type=str)
+    cat_q  = request.args.get("category", "", type=str)
+
+    # Ponovljeni upiti se služe iz keša dok se katalog ne promeni
+    version = CatalogVersion.current()
+    body = SearchCache.get(version, name_q, cat_q)
+    if body is None:
+        if SearchIndex.enabled:
+            SearchIndex.refresh(version)
+            categories, out_products = SearchIndex.search(name_q, cat_q)
+        else:
+            categories, out_products = search_sql(name_q, cat_q)
+        body = app.json.dumps({"categories": categories, "products": out_products})
+        SearchCache.put(version, name_q, cat_q, body)
+
+    return app.response_class(body, mimetype="application/json"), 200
 
 
 @app.route("/order", methods=["POST"])
@@ -126,6 +156,35 @@ def create_order():
 
     data = request.get_json(silent=True) or {}
 
+    key = request.headers.get("Idempotency-Key")
+    if key is None:
+        return place_order(email, data)
+    if not key or len(key) > Idempotency.max_key_length:
+        return jsonify({"message": "Invalid idempotency key."}), 400
+
+    # Ponovljeni zahtev sa istim ključem dobija odgovor prvog, bez nove narudžbine i deploy-a
+    request_hash = Idempotency.request_hash(data)
+    state, existing = Idempotency.acquire(email, key, request_hash)
+    if state == "mismatch":
+        return jsonify({"message": "Idempotency key was used for a different request."}), 400
+    if state == "done":
+        return app.response_class(existing.response_body, mimetype="application/json"), existing.response_status
+    if state == "busy":
+        return jsonify({"message": "Request with this idempotency key is still in progress."}), 409
+
+    try:
+        response, status = place_order(email, data)
+    except Exception:
+        Idempotency.release(email, key)
+        raise
+    if status == 200:
+        Idempotency.complete(email, key, status, response.get_data(as_text=True))
+    else:
+        Idempotency.release(email, key)
+    return response, status
+
+
+def place_order(email, data):
     # 1) Field requests is missing.
     if "requests" not in data:
         return jsonify({"message": "Field requests is missing."}), 400
@@ -155,52 +214,139 @@ def create_order():
             return jsonify({"message": f"Invalid product quantity for request number {idx}."}), 400
 
     # 6) Invalid product for request number N. (ne postoji)
+    # Cene, imena i kategorije svih proizvoda iz korpe se čitaju jednim upitom
     product_ids = [int(x["id"]) for x in requests_list]
-    existing_ids = set(pid for (pid,) in db.session.query(Product.id).filter(Product.id.in_(product_ids)).all())
+    products = {
+        pid: (name, price, category_names)
+        for pid, name, price, category_names in db.session.query(
+            Product.id, Product.name, Product.price, Product.category_names
+        ).filter(Product.id.in_(set(product_ids))).all()
+    }
     for idx, pid in enumerate(product_ids):
-        if pid not in existing_ids:
+        if pid not in products:
             return jsonify({"message": f"Invalid product for request number {idx}."}), 400
 
     # 7) Field address is missing
     if "address" not in data or data["address"] == "":
         return jsonify({"message": "Field address is missing."}), 400
 
-
-    # Total price
-    total_price = 0
+    # Ponovljeni proizvod se spaja u jednu stavku (order_product ima ključ (order_id, product_id))
+    quantities = {}
     for item in requests_list:
-        product = Product.query.get(int(item["id"]))
-        quantity = int(item["quantity"])
-        total_price += quantity * product.price
-
+        pid = int(item["id"])
+        quantities[pid] = quantities.get(pid, 0) + int(item["quantity"])
 
-    # 8) Trying to create contract
-    contract = OrderContract.deploy(data["address"], total_price)
+    # Total price
+    total_price = sum(quantity * products[pid][1] for pid, quantity in quantities.items())
 
-    if not contract["success"]:
-        return jsonify({"message": contract["message"]}), 400
+    # 8) Adresa kupca mora biti validna pre kreiranja ugovora
+    if not OrderContract.address_valid(data["address"]):
+        return jsonify({"message": "Invalid address."}), 400
 
-    # Kreiraj narudžbinu
+    # Kreiraj narudžbinu, ugovor se deploy-uje u pozadini
     now = datetime.now(timezone.utc)
-    order = Order(email=email, status="CREATED", timestamp=now, contract_address=contract["message"])
+    order = Order(
+        email=email, status="CREATED", timestamp=now, total_price=total_price,
+        deploy_status="DEPLOYING", contract_mode=OrderContract.mode
+    )
     db.session.add(order)
     db.session.flush()
 
-    for item in requests_list:
-        db.session.add(
-            OrderProduct(
-                order_id=order.id,
-                product_id=int(item["id"]),
-                quantity=int(item["quantity"])
-
-            )
+    # Sve stavke jednim višerednim INSERT-om, sa snimkom cene, imena i kategorija
+    if quantities:
+        db.session.execute(
+            insert(OrderProduct),
+            [
+                {
+                    "order_id": order.id,
+                    "product_id": pid,
+                    "quantity": quantity,
+                    "unit_price": products[pid][1],
+                    "product_name": products[pid][0],
+                    "category_names": products[pid][2] or []
+                }
+                for pid, quantity in quantities.items()
+            ]
         )
+    # zbir za /product_statistics se menja u istoj transakciji
+    ProductSales.add(quantities)
 
     db.session.commit()
+    Replica.mark_write(email)
+
+    ContractDeployer.submit(order.id, data["address"], total_price, order.contract_mode)
     return jsonify({"id": order.id}), 200
 
 
+def order_json(o):
+    # Istorija se služi iz snimaka upisanih pri kreiranju narudžbine
+    products_json = []
+    total_price = Decimal("0.00")
+
+    for op in o.products:
+        price = Decimal(op.unit_price or 0)
+        qty = int(op.quantity)
+        total_price += price * qty
+
+        products_json.append({
+            "categories": op.category_names or [],
+            "name": op.product_name,
+            "price": float(price),
+            "quantity": qty
+        })
+
+    if o.total_price is not None:
+        total_price = Decimal(o.total_price)
+
+    order_json = {
+        "products": products_json,
+        "price": float(total_price),
+        "status": o.status,
+        "timestamp": isoformat_z(o.timestamp),
+        "deployment": o.deploy_status
+    }
+    if o.deploy_status == "FAILED":
+        order_json["deployment_error"] = o.deploy_error
+    return order_json
+
+
+def orders_page(email, after=None, limit=None):
+    # Stavke se učitavaju unapred (selectinload), pa broj upita ne zavisi od broja
+    # narudžbina; tabele product i category se ne čitaju. Stranica počinje posle
+    # ključa (timestamp, id) poslednje vraćene narudžbine.
+    q = (
+        Order.query
+        .filter_by(email=email)
+        .options(selectinload(Order.products))
+    )
+    if after is not None:
+        timestamp, order_id = after
+        q = q.filter(or_(
+            Order.timestamp > timestamp,
+            and_(Order.timestamp == timestamp, Order.id > order_id)
+        ))
+    q = q.order_by(Order.timestamp.asc(), Order.id.asc())
+    if limit is not None:
+        q = q.limit(limit)
+    return q.all()
+
+
+def order_cursor(o):
+    return Pagination.encode_cursor([o.timestamp.isoformat(), o.id])
+
+
+def parse_order_cursor(args):
+    ok, key = Pagination.decode_cursor(args, 2)
+    if not ok or key is None:
+        return ok, None
+    try:
+        return True, (datetime.fromisoformat(key[0]), int(key[1]))
+    except (TypeError, ValueError):
+        return False, None
+
+
 @app.route("/status", methods=["GET"])
+@read_replica
 def status():
     ok, val = auth_check(required_role="customer")
     if not ok:
@@ -208,44 +354,41 @@ def status():
     else:
         email = val.get("email")
 
+    # Posle sopstvene izmene kupac čita sa primarne baze, replika možda kasni
+    if Replica.wrote_recently(email):
+        Replica.use_primary()
 
-
-    orders = Order.query.filter_by(email=email).order_by(Order.timestamp.asc()).all()
-
-    out = []
-    for o in orders:
-        rows = (
-            db.session.query(OrderProduct, Product)
-            .join(Product, Product.id == OrderProduct.product_id)
-            .filter(OrderProduct.order_id == o.id)
-            .all()
-        )
-
-        products_json = []
-        total_price = Decimal("0.00")
-
-        for op, p in rows:
-            cat_names = [c.name for c in p.categories]
-            cat_names.sort()
-            price = Decimal(p.price or 0)
-            qty = int(op.quantity)
-            total_price += price * qty
-
-            products_json.append({
-                "categories": cat_names,
-                "name": p.name,
-                "price": float(price),
-                "quantity": qty
-            })
-
-        out.append({
-            "products": products_json,
-            "price": float(total_price),
-            "status": o.status,
-            "timestamp": isoformat_z(o.timestamp)
-        })
-
-    return jsonify({"orders": out}), 200
+    ok, after = parse_order_cursor(request.args)
+    if not ok:
+        return jsonify({"message": "Invalid cursor."}), 400
+
+    # stream=1: cela istorija se šalje deo po deo, uz ograničenu memoriju
+    if Pagination.streamed(request.args):
+        def chunks(after):
+            while True:
+                orders = orders_page(email, after, Pagination.stream_chunk)
+                if not orders:
+                    return
+                yield [order_json(o) for o in orders]
+                after = (orders[-1].timestamp, orders[-1].id)
+                db.session.expunge_all()
+                if len(orders) < Pagination.stream_chunk:
+                    return
+        return Pagination.stream("orders", chunks(after))
+
+    if Pagination.requested(request.args):
+        limit = Pagination.parse_limit(request.args)
+        if limit is None:
+            return jsonify({"message": "Invalid limit."}), 400
+        orders = orders_page(email, after, limit + 1)
+        next_cursor = order_cursor(orders[limit - 1]) if len(orders) > limit else None
+        return jsonify({
+            "orders": [order_json(o) for o in orders[:limit]],
+            "next_cursor": next_cursor
+        }), 200
+
+    orders = orders_page(email)
+    return jsonify({"orders": [order_json(o) for o in orders]}), 200
 
 
 @app.route("/delivered", methods=["POST"])
@@ -276,14 +419,19 @@ def delivered():
     if order.status != "PENDING":
         return jsonify({"message": "Delivery not complete."}), 400
 
-    delivery = OrderContract.confirm_delivery(order.contract_address)
+    chain = OrderContract.for_mode(order.contract_mode)
+    delivery = chain.confirm_delivery(order.contract_address, order_id=order.id)
 
+    if delivery.get("submitted"):
+        # Transakcija je poslata ali potvrda nije stigla na vreme; status pomera indekser
+        return jsonify({"message": "Delivery confirmation submitted.", "tx_hash": delivery["message"]}), 202
     if not delivery["success"]:
         return jsonify({"message": delivery["message"]}), 400
 
 
-    order.status = "COMPLETE"
+    ProductSales.move(order.id, "PENDING", "COMPLETE")
     db.session.commit()
+    Replica.mark_write(email)
     return "", 200
 
 @app.route("/generate_invoice", methods=["POST"])
@@ -307,6 +455,10 @@ def generate_invoice():
     order = Order.query.filter_by(id=oid).first()
     if not order:
         return jsonify({"message": "Invalid order id."}), 400
+    if order.deploy_status == "DEPLOYING":
+        return jsonify({"message": "Order contract is still deploying."}), 400
+    if order.deploy_status == "FAILED":
+        return jsonify({"message": "Order contract deployment failed."}), 400
 
     # 3) Missing address
     if "address" not in data:
@@ -315,13 +467,61 @@ def generate_invoice():
     customer_address = data["address"]
     contract_address = order.contract_address
 
-    generated = OrderContract.generate_invoice(contract_address, customer_address)
+    chain = OrderContract.for_mode(order.contract_mode)
+    generated = chain.generate_invoice(contract_address, customer_address, order_id=order.id)
     if not generated["success"]:
         return jsonify({"message": generated["message"]}), 400
 
     return jsonify({"invoice": generated["message"]}), 200
 
 
+@app.errorhandler(ChainUnavailable)
+def chain_unavailable(e):
+    # Prekidač je otvoren ili je istekao rok operacije: brz odgovor umesto visećeg radnika
+    return jsonify({"message": str(e)}), 503
+
+
+@app.route("/ready", methods=["GET"])
+def ready():
+    # Spremnost servisa: dostupnost baze i blockchain čvora
+    checks = {"db": db_ready(), "node": OrderContract.node_ready()}
+    ok = all(checks.values())
+    return jsonify({"ready": ok, **checks}), 200 if ok else 503
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    return jsonify({
+        "chain_breaker": ChainBreaker.stats(),
+        "db_pool": pool_stats(),
+        "receipts_pending": ReceiptTracker.pending_count(),
+        "caches": OrderContract.cache_stats(),
+        "search_cache": SearchCache.stats()
+    }), 200
+
+
+DEBUG = os.getenv("FLASK_DEBUG", "1") == "1"
+
+
+def serves_requests():
+    # Sa reloader-om (python customer.py u debug režimu) roditeljski proces samo prati
+    # izmene fajlova, a zahteve služi dete sa WERKZEUG_RUN_MAIN; bez reloader-a
+    # (WSGI server, debug=False) zahteve služi sam proces
+    return not (__name__ == "__main__" and DEBUG) or os.environ.get("WERKZEUG_RUN_MAIN") == "true"
+
+
+def start_background():
+    ContractDeployer.resume()
+    if SearchIndex.enabled:
+        # Indeks pretrage se gradi pri pokretanju, a posle se samo dopunjuje
+        with app.app_context():
+            SearchIndex.refresh()
+
+
+# BACKGROUND_JOBS=0 za skripte i testove koji samo importuju app
+if serves_requests() and os.getenv("BACKGROUND_JOBS", "1") == "1":
+    start_background()
+
 
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=5002, debug=True)
+    app.run(host="0.0.0.0", port=5002, debug=DEBUG)
@@ -0,0 +1,135 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import update
+from web3.exceptions import TimeExhausted
+
+from blockchain import OrderContract, ChainBreaker, ChainUnavailable, ReceiptTracker, NonceManager
+from ORM import db, Order, ProductSales
+
+
+class ContractDeployer:
+    """
+    Pozadinski bazen radnika koji deploy-uje ugovore za narudžbine.
+    Narudžbina je već upisana sa deploy_status="DEPLOYING", radnik šalje
+    transakciju i popunjava contract_address kada stigne potvrda. Hash potpisane
+    transakcije se upisuje pre slanja, pa posle restarta narudžbina bez hash-a
+    sigurno nema transakciju u lancu.
+    """
+    app = None
+    executor = None
+
+    @staticmethod
+    def init_app(app):
+        ContractDeployer.app = app
+        ContractDeployer.executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv("DEPLOY_WORKERS", "4")),
+            thread_name_prefix="deployer"
+        )
+
+    @staticmethod
+    def submit(order_id, customer_address, price, mode):
+        return ContractDeployer.executor.submit(ContractDeployer._run, order_id, customer_address, price, mode)
+
+    @staticmethod
+    def resume():
+        # Posle restarta: narudžbine čija je transakcija poslata čekaju potvrdu,
+        # a one bez transakcije se proglašavaju neuspešnim
+        with ContractDeployer.app.app_context():
+            pending = Order.query.filter_by(deploy_status="DEPLOYING").all()
+            for order in pending:
+                if order.deploy_tx_hash:
+                    ContractDeployer.executor.submit(
+                        ContractDeployer._wait, order.id, order.deploy_tx_hash, order.contract_mode
+                    )
+                else:
+                    ProductSales.fail(order.id, "Contract deployment interrupted.")
+            db.session.commit()
+
+    @staticmethod
+    def _run(order_id, customer_address, price, mode):
+        with ContractDeployer.app.app_context():
+            signed = []
+
+            def on_signed(tx_hash):
+                ContractDeployer._save_hash(order_id, tx_hash)
+                signed.append(tx_hash)
+
+            try:
+                sent = OrderContract.for_mode(mode).send_deploy(customer_address, price, order_id, on_signed)
+            except Exception as e:
+                print(f"Deploy for order {order_id} failed: {e}")
+                if signed and not NonceManager.is_nonce_error(e):
+                    # Slanje je prekinuto, a čvor je transakciju možda primio; čeka se
+                    # potvrda sačuvanog hash-a kao posle restarta
+                    ContractDeployer._wait(order_id, signed[-1], mode)
+                    return
+                sent = {"success": False, "message": "Contract deployment failed."}
+
+            if not sent["success"]:
+                ContractDeployer._finish(order_id, None, sent["message"])
+                return
+
+        ContractDeployer._wait(order_id, sent["message"], mode)
+
+    @staticmethod
+    def _save_hash(order_id, tx_hash):
+        # Posebna transakcija: hash mora biti upisan pre nego što transakcija ode na čvor
+        with db.engine.begin() as conn:
+            conn.execute(update(Order).where(Order.id == order_id).values(deploy_tx_hash=tx_hash))
+
+    @staticmethod
+    def _wait(order_id, tx_hash, mode):
+        with ContractDeployer.app.app_context():
+            try:
+                result = OrderContract.for_mode(mode).deploy_result(tx_hash)
+            except ChainUnavailable:
+                # Transakcija je poslata, potvrda se ponovo čeka kada se prekidač ohladi
+                ContractDeployer._retry(order_id, tx_hash, mode)
+                return
+            except TimeExhausted as e:
+                # Dok je prekidač otvoren petlja ne vidi nove blokove, pa isteklo
+                # čekanje ne znači da transakcija nije prošla
+                if ChainBreaker.state != "CLOSED" or not ContractDeployer._missing(tx_hash):
+                    ContractDeployer._retry(order_id, tx_hash, mode)
+                    return
+                print(f"Deploy for order {order_id} failed: {e}")
+                result = {"success": False, "message": "Contract deployment failed."}
+            except Exception as e:
+                print(f"Deploy for order {order_id} failed: {e}")
+                result = {"success": False, "message": "Contract deployment failed."}
+
+            if result["success"]:
+                ContractDeployer._finish(order_id, result["message"], None)
+            else:
+                ContractDeployer._finish(order_id, None, result["message"])
+
+    @staticmethod
+    def _retry(order_id, tx_hash, mode):
+        timer = threading.Timer(
+            ChainBreaker.cooldown,
+            ContractDeployer.executor.submit, (ContractDeployer._wait, order_id, tx_hash, mode)
+        )
+        timer.daemon = True
+        timer.start()
+
+    @staticmethod
+    def _missing(tx_hash):
+        # True samo ako čvor odgovara, a potvrde transakcije nema
+        try:
+            return ReceiptTracker._receipt(tx_hash) is None
+        except ChainUnavailable:
+            return False
+
+    @staticmethod
+    def _finish(order_id, contract_address, error):
+        if contract_address:
+            order = db.session.get(Order, order_id)
+            order.contract_address = contract_address
+            order.deploy_status = "DEPLOYED"
+            order.deploy_error = None
+        else:
+            # količine neuspele narudžbine se skidaju iz /product_statistics u istoj transakciji
+            ProductSales.fail(order_id, error)
+        db.session.commit()
@@ -0,0 +1,105 @@
+import hashlib
+import json
+import os
+import time
+from datetime import datetime, timezone, timedelta
+
+from sqlalchemy import select, insert, update, delete
+
+from ORM import db, IdempotencyKey
+
+
+class Idempotency:
+    """
+    Idempotency-Key za POST /order. Prvi zahtev sa ključem ga preuzima (red u
+    stanju PENDING sa kratkim zakupom), a ponovljeni zahtevi čekaju dok se ne
+    upiše njegov odgovor i vraćaju isti odgovor umesto nove narudžbine.
+    Čuvaju se samo uspešni odgovori; posle greške se ključ oslobađa.
+    """
+    ttl = int(os.getenv("IDEMPOTENCY_TTL", "86400"))
+    lease = int(os.getenv("IDEMPOTENCY_LEASE", "60"))
+    wait_timeout = float(os.getenv("IDEMPOTENCY_WAIT", "30"))
+    poll_interval = 0.1
+    max_key_length = 128
+
+    @staticmethod
+    def request_hash(data):
+        return hashlib.sha256(json.dumps(data, sort_keys=True).encode()).hexdigest()
+
+    @staticmethod
+    def claim(email, key, request_hash):
+        # None ako je ključ preuzet, inače postojeći red (status, request_hash, odgovor)
+        where = (IdempotencyKey.email == email, IdempotencyKey.idempotency_key == key)
+        while True:
+            now = datetime.now(timezone.utc)
+            with db.engine.begin() as conn:
+                # usput se briše deo isteklih ključeva
+                conn.execute(
+                    delete(IdempotencyKey)
+                    .where(IdempotencyKey.expires_at < now)
+                    .with_dialect_options(mysql_limit=100)
+                )
+                claimed = conn.execute(
+                    insert(IdempotencyKey).prefix_with("IGNORE").values(
+                        email=email, idempotency_key=key, request_hash=request_hash,
+                        status="PENDING", expires_at=now + timedelta(seconds=Idempotency.lease)
+                    )
+                ).rowcount == 1
+                if not claimed:
+                    # Istekao ključ (ili napušten zakup) se preuzima kao nov
+                    claimed = conn.execute(
+                        update(IdempotencyKey)
+                        .where(*where, IdempotencyKey.expires_at < now)
+                        .values(
+                            request_hash=request_hash, status="PENDING", response_status=None,
+                            response_body=None, expires_at=now + timedelta(seconds=Idempotency.lease)
+                        )
+                    ).rowcount == 1
+                if claimed:
+                    return None
+                existing = conn.execute(
+                    select(
+                        IdempotencyKey.status, IdempotencyKey.request_hash,
+                        IdempotencyKey.response_status, IdempotencyKey.response_body
+                    ).where(*where)
+                ).one_or_none()
+            # red je obrisan u međuvremenu (prvi zahtev nije uspeo), pokušava se ponovo
+            if existing is not None:
+                return existing
+
+    @staticmethod
+    def complete(email, key, status, body):
+        with db.engine.begin() as conn:
+            conn.execute(
+                update(IdempotencyKey)
+                .where(IdempotencyKey.email == email, IdempotencyKey.idempotency_key == key)
+                .values(
+                    status="DONE", response_status=status, response_body=body,
+                    expires_at=datetime.now(timezone.utc) + timedelta(seconds=Idempotency.ttl)
+                )
+            )
+
+    @staticmethod
+    def release(email, key):
+        with db.engine.begin() as conn:
+            conn.execute(
+                delete(IdempotencyKey)
+                .where(IdempotencyKey.email == email, IdempotencyKey.idempotency_key == key)
+                .where(IdempotencyKey.status == "PENDING")
+            )
+
+    @staticmethod
+    def acquire(email, key, request_hash):
+        # ("claimed", None), ("done", red), ("mismatch", red) ili ("busy", None)
+        deadline = time.monotonic() + Idempotency.wait_timeout
+        while True:
+            existing = Idempotency.claim(email, key, request_hash)
+            if existing is None:
+                return "claimed", None
+            if existing.request_hash != request_hash:
+                return "mismatch", existing
+            if existing.status == "DONE":
+                return "done", existing
+            if time.monotonic() >= deadline:
+                return "busy", None
+            time.sleep(Idempotency.poll_interval)
@@ -1,11 +1,7 @@
 #!/bin/bash
-# čekaj dok Ganache ne odgovori
-while ! curl -s http://ganache:8545 > /dev/null; do
-    echo "Waiting for Ganache..."
-    sleep 2
-done
+# Ganache i baza su spremni pre starta (depends_on: service_healthy),
+# a spremnost samog servisa se proverava preko /ready
 
 # start blockchain inicijalizacije
 #python init_blockchain.py
 python customer.py
-
@@ -0,0 +1,188 @@
+import os
+import threading
+
+from sqlalchemy import select
+
+from ORM import db, Product, Category, ProductCategory, CatalogVersion
+from cache import LRUCache
+
+
+class SearchIndex:
+    """
+    Invertovani indeks trigrama nad imenima proizvoda i kategorija, u memoriji
+    procesa. ILIKE '%q%' zbog vodećeg džokera uvek skenira tabele; ovde se
+    kandidati dobijaju presekom lista trigrama upita, a podstring se proverava
+    samo nad njima. Indeks se dopunjuje proizvodima čiji je catalog_version
+    veći od poslednje učitane verzije: /update upisuje verziju u svaki dodati i
+    izmenjeni proizvod, a verzije se dodeljuju redom commit-ova (CatalogVersion.bump
+    drži lock reda do commit-a), pa se ne propuštaju ni uvozi koji se završe
+    obrnutim redom od id-jeva.
+    """
+    enabled = os.getenv("SEARCH_INDEX", "1") == "1"
+    gram = 3
+    lock = threading.RLock()
+
+    # id -> ime malim slovima, za proveru podstringa
+    product_keys = {}
+    category_keys = {}
+    # trigram -> skup id-jeva
+    product_grams = {}
+    category_grams = {}
+
+    products = {}
+    category_names = {}
+    product_categories = {}
+    category_products = {}
+    loaded = False
+    last_catalog_version = 0
+
+    @staticmethod
+    def grams(text):
+        return {text[i:i + SearchIndex.gram] for i in range(len(text) - SearchIndex.gram + 1)}
+
+    @staticmethod
+    def refresh(latest_version=None):
+        # Jedan upit nad verzijom kataloga; proizvodi se čitaju samo ako je verzija nova
+        if latest_version is None:
+            latest_version = CatalogVersion.current()
+        if SearchIndex.loaded and latest_version <= SearchIndex.last_catalog_version:
+            return
+
+        with SearchIndex.lock:
+            first_version = SearchIndex.last_catalog_version
+            initial = not SearchIndex.loaded
+            if not initial and latest_version <= first_version:
+                return
+
+            # Prvo učitavanje čita ceo katalog, a posle samo nove i izmenjene proizvode
+            changed = Product.catalog_version <= latest_version
+            if not initial:
+                changed = changed & (Product.catalog_version > first_version)
+            products = db.session.execute(
+                select(Product.id, Product.name, Product.price, Product.category_names).where(changed)
+            ).all()
+            links = db.session.execute(
+                select(ProductCategory.product_id, ProductCategory.category_id)
+                .join(Product, Product.id == ProductCategory.product_id)
+                .where(changed)
+            ).all() if products else []
+
+            # Kategorije bez proizvoda se nikad ne vraćaju, pa se učitavaju samo one iz veza
+            missing = {category_id for _, category_id in links} - set(SearchIndex.category_names)
+            categories = db.session.execute(
+                select(Category.id, Category.name).where(Category.id.in_(missing))
+            ).all() if missing else []
+
+            for category_id, name in categories:
+                SearchIndex._add(category_id, name, SearchIndex.category_keys, SearchIndex.category_grams)
+                SearchIndex.category_names[category_id] = name
+                SearchIndex.category_products.setdefault(category_id, set())
+            for product_id, name, price, category_names in products:
+                if product_id in SearchIndex.products:
+                    # sync ne menja ime, menjaju se cena i kategorije
+                    for category_id in SearchIndex.product_categories[product_id]:
+                        SearchIndex.category_products[category_id].discard(product_id)
+                else:
+                    SearchIndex._add(product_id, name, SearchIndex.product_keys, SearchIndex.product_grams)
+                SearchIndex.products[product_id] = {
+                    "name": name,
+                    "price": float(price) if price is not None else 0.0,
+                    "categories": category_names or []
+                }
+                SearchIndex.product_categories[product_id] = set()
+            for product_id, category_id in links:
+                SearchIndex.product_categories[product_id].add(category_id)
+                SearchIndex.category_products[category_id].add(product_id)
+
+            SearchIndex.loaded = True
+            SearchIndex.last_catalog_version = max(first_version, latest_version)
+
+    @staticmethod
+    def _add(item_id, name, keys, grams):
+        key = name.lower()
+        keys[item_id] = key
+        for gram in SearchIndex.grams(key):
+            grams.setdefault(gram, set()).add(item_id)
+
+    @staticmethod
+    def _matching(query, keys, grams):
+        query = query.lower()
+        if not query:
+            return set(keys)
+        if len(query) < SearchIndex.gram:
+            candidates = keys
+        else:
+            postings = sorted((grams.get(gram, set()) for gram in SearchIndex.grams(query)), key=len)
+            candidates = set.intersection(*postings)
+        return {item_id for item_id in candidates if query in keys[item_id]}
+
+    @staticmethod
+    def search(name_q, cat_q):
+        # Isti ugovor kao /search nad bazom: kategorije čije ime sadrži cat_q i imaju
+        # proizvod čije ime sadrži name_q, i obrnuto za proizvode
+        with SearchIndex.lock:
+            products = SearchIndex._matching(name_q, SearchIndex.product_keys, SearchIndex.product_grams)
+            categories = SearchIndex._matching(cat_q, SearchIndex.category_keys, SearchIndex.category_grams)
+
+            category_names = sorted(
+                (SearchIndex.category_names[c] for c in categories if SearchIndex.category_products[c] & products),
+                key=lambda name: (name.lower(), name)
+            )
+
+            out_products = []
+            for product_id in sorted(products):
+                cats = SearchIndex.product_categories[product_id]
+                if not cats & categories:
+                    continue
+                product = SearchIndex.products[product_id]
+                out_products.append({
+                    "categories": product["categories"],
+                    "id": product_id,
+                    "name": product["name"],
+                    "price": product["price"]
+                })
+
+        return category_names, out_products
+
+
+class SearchCache:
+    """
+    Ograničen LRU keš serijalizovanih /search odgovora. Ključ je normalizovan upit
+    (ILIKE ne razlikuje velika i mala slova) zajedno sa verzijom kataloga, pa
+    posle /update stari odgovori više nisu dostupni; pri promeni verzije se
+    keš i prazni da ne zauzima mesto.
+    """
+    cache = LRUCache(int(os.getenv("SEARCH_CACHE_SIZE", "1024")))
+    version = None
+    invalidations = 0
+    lock = threading.Lock()
+
+    @staticmethod
+    def key(version, name_q, cat_q):
+        return version, name_q.lower(), cat_q.lower()
+
+    @staticmethod
+    def get(version, name_q, cat_q):
+        with SearchCache.lock:
+            # verzija samo raste; zahtev koji je pročitao stariju verziju ne briše keš
+            if SearchCache.version is None or version > SearchCache.version:
+                if SearchCache.version is not None:
+                    SearchCache.invalidations += 1
+                SearchCache.cache.clear()
+                SearchCache.version = version
+        return SearchCache.cache.get(SearchCache.key(version, name_q, cat_q))
+
+    @staticmethod
+    def put(version, name_q, cat_q, body):
+        with SearchCache.lock:
+            if version != SearchCache.version:
+                return
+        SearchCache.cache.put(SearchCache.key(version, name_q, cat_q), body)
+
+    @staticmethod
+    def stats():
+        stats = SearchCache.cache.stats()
+        with SearchCache.lock:
+            stats["catalog_version"] = SearchCache.version
+            stats["invalidations"] = SearchCache.invalidations
+        return stats
@@ -0,0 +1,40 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ["BACKGROUND_JOBS"] = "0"
+
+import ORM
+
+
+@pytest.fixture(scope="session")
+def app():
+    # customer.py pravi engine pri importu, pa se MySQL URI menja pre toga
+    # deljenom SQLite bazom u memoriji (svaka konekcija iz bazena vidi iste tabele)
+    init_app = ORM.db.init_app
+
+    def sqlite_init_app(flask_app):
+        flask_app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///file:customer_tests?mode=memory&cache=shared&uri=true"
+        init_app(flask_app)
+
+    ORM.db.init_app = sqlite_init_app
+    try:
+        import customer
+    finally:
+        ORM.db.init_app = init_app
+
+    with customer.app.app_context():
+        ORM.db.create_all()
+    return customer.app
+
+
+@pytest.fixture
+def login(app, monkeypatch):
+    import customer
+
+    def as_customer(email):
+        monkeypatch.setattr(customer, "auth_check", lambda required_role=None: (True, {"email": email, "role": "customer"}))
+    return as_customer
@@ -0,0 +1,58 @@
+from datetime import datetime
+
+import pytest
+
+from ORM import db, Order, OrderChainState
+from blockchain import OrderContract, ReceiptTracker, ChainDeadlineExceeded
+
+
+@pytest.fixture
+def chain(app, monkeypatch):
+    # Slanje uspeva, a potvrda ne stiže pre isteka roka
+    sent = []
+
+    def send_owner_transaction(build, on_signed=None):
+        sent.append(build)
+        return b"\x02" * 32
+
+    def wait(tx_hash, timeout=None):
+        raise ChainDeadlineExceeded()
+
+    monkeypatch.setattr(OrderContract, "contract_at", staticmethod(lambda address: None))
+    monkeypatch.setattr(OrderContract, "send_owner_transaction", staticmethod(send_owner_transaction))
+    monkeypatch.setattr(ReceiptTracker, "wait", staticmethod(wait))
+    return sent
+
+
+def add_order(app, email, **state):
+    with app.app_context():
+        order = Order(email=email, status="PENDING", timestamp=datetime(2024, 1, 1),
+                      contract_address="0x" + "11" * 20, contract_mode="PER_ORDER")
+        db.session.add(order)
+        db.session.flush()
+        db.session.add(OrderChainState(order_id=order.id, courier="0x" + "22" * 20, **state))
+        db.session.commit()
+        return order.id
+
+
+def test_timeout_after_send_is_submitted(app, login, chain):
+    order_id = add_order(app, "late@test.com")
+    login("late@test.com")
+
+    response = app.test_client().post("/delivered", json={"id": order_id})
+
+    assert response.status_code == 202
+    assert response.get_json()["tx_hash"] == "0x" + "02" * 32
+    with app.app_context():
+        # status pomera indekser kada vidi DeliveryConfirmed
+        assert db.session.get(Order, order_id).status == "PENDING"
+
+
+def test_retry_after_indexed_delivery_does_not_resend(app, chain):
+    order_id = add_order(app, "retry@test.com", delivered=True)
+
+    with app.app_context():
+        result = OrderContract.confirm_delivery("0x" + "11" * 20, order_id=order_id)
+
+    assert result["success"] and not result.get("submitted")
+    assert chain == []
@@ -0,0 +1,52 @@
+from datetime import datetime
+
+import pytest
+
+from ORM import db, Order
+from blockchain import OrderContract, ChainUnavailable
+from deployer import ContractDeployer
+
+
+@pytest.fixture
+def deployer(app, monkeypatch):
+    waits = []
+    monkeypatch.setattr(ContractDeployer, "app", app)
+    monkeypatch.setattr(ContractDeployer, "_wait", staticmethod(lambda order_id, tx_hash, mode: waits.append((order_id, tx_hash))))
+    return waits
+
+
+def add_order(app, **values):
+    with app.app_context():
+        order = Order(email="deploy@test.com", status="CREATED", timestamp=datetime(2024, 1, 1), deploy_status="DEPLOYING", **values)
+        db.session.add(order)
+        db.session.commit()
+        return order.id
+
+
+def test_interrupted_send_waits_on_saved_hash(app, deployer, monkeypatch):
+    order_id = add_order(app)
+
+    def send_deploy(customer_address, price, order_id=None, on_signed=None):
+        on_signed("0xabc")
+        raise ChainUnavailable()
+
+    monkeypatch.setattr(OrderContract, "send_deploy", staticmethod(send_deploy))
+    ContractDeployer._run(order_id, "0x0", 10, "PER_ORDER")
+
+    assert deployer == [(order_id, "0xabc")]
+    with app.app_context():
+        order = db.session.get(Order, order_id)
+        assert (order.deploy_status, order.deploy_tx_hash) == ("DEPLOYING", "0xabc")
+
+
+def test_resume_fails_only_orders_without_hash(app, deployer, monkeypatch):
+    monkeypatch.setattr(ContractDeployer, "executor", type("Inline", (), {"submit": staticmethod(lambda fn, *args: fn(*args))}))
+    sent = add_order(app, deploy_tx_hash="0xdef")
+    unsent = add_order(app)
+
+    ContractDeployer.resume()
+
+    assert (sent, "0xdef") in deployer
+    with app.app_context():
+        assert db.session.get(Order, sent).deploy_status == "DEPLOYING"
+        assert db.session.get(Order, unsent).deploy_status == "FAILED"
@@ -0,0 +1,48 @@
+import pytest
+
+from ORM import db, NonceReservation
+from blockchain import OrderContract, NonceManager, ReceiptTracker, ChainUnavailable
+
+
+@pytest.fixture
+def chain(app, monkeypatch):
+    # Čvor se simulira: pending brojač naloga raste samo kad slanje uspe
+    state = {"pending": 7, "sent": [], "fail": 0}
+    owner = OrderContract.owner_address
+
+    def send_raw_transaction(raw):
+        if state["fail"]:
+            state["fail"] -= 1
+            raise ChainUnavailable()
+        state["pending"] += 1
+        return b"\x01" * 32
+
+    monkeypatch.setattr(NonceManager, "store", "db")
+    monkeypatch.setattr(NonceManager, "synced", set())
+    monkeypatch.setattr(NonceManager, "stale", set())
+    monkeypatch.setattr(NonceManager, "_chain_nonce", staticmethod(lambda account: state["pending"]))
+    monkeypatch.setattr(ReceiptTracker, "track", staticmethod(lambda tx_hash: None))
+    monkeypatch.setattr(ReceiptTracker, "untrack", staticmethod(lambda tx_hash: None))
+    monkeypatch.setattr(OrderContract.w3.eth, "send_raw_transaction", send_raw_transaction)
+
+    with app.app_context():
+        db.session.merge(NonceReservation(account=owner, next_nonce=0))
+        db.session.commit()
+        yield state
+
+
+def send(state):
+    def build(owner_address, nonce):
+        state["sent"].append(nonce)
+        return {"to": owner_address, "value": 0, "gas": 21000, "gasPrice": 1, "nonce": nonce, "chainId": 1337}
+    return OrderContract.send_owner_transaction(build)
+
+
+def test_failed_send_resyncs_nonce(chain):
+    chain["fail"] = 1
+    with pytest.raises(ChainUnavailable):
+        send(chain)
+    send(chain)
+    send(chain)
+    # nonce neuspelog slanja se ponovo koristi, bez rupe
+    assert chain["sent"] == [7, 7, 8]
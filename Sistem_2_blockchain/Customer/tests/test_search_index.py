@@ -0,0 +1,56 @@
+from decimal import Decimal
+
+from sqlalchemy import update
+
+from ORM import db, Product, Category, ProductCategory, CatalogVersion
+from search_index import SearchIndex
+
+
+def set_version(version):
+    if db.session.get(CatalogVersion, "catalog") is None:
+        db.session.add(CatalogVersion(name="catalog", version=version))
+    else:
+        db.session.execute(update(CatalogVersion).where(CatalogVersion.name == "catalog").values(version=version))
+
+
+def add_product(product_id, name, price, category, version):
+    db.session.add(Product(id=product_id, name=name, price=Decimal(price), category_names=[category.name], catalog_version=version))
+    db.session.flush()
+    db.session.add(ProductCategory(product_id=product_id, category_id=category.id))
+    set_version(version)
+    db.session.commit()
+
+
+def test_refresh_picks_up_products_committed_out_of_id_order(app):
+    with app.app_context():
+        fruit = Category(name="index-fruit")
+        db.session.add(fruit)
+        db.session.commit()
+
+        # uvoz sa većim id-jem je commit-ovan prvi
+        add_product(9002, "index-apple", "1.00", fruit, 1)
+        SearchIndex.refresh()
+        add_product(9001, "index-apricot", "2.00", fruit, 2)
+        SearchIndex.refresh()
+
+        _, products = SearchIndex.search("index-ap", "index-fruit")
+        assert [p["id"] for p in products] == [9001, 9002]
+
+        # sync izmena postojećeg proizvoda menja cenu i kategorije
+        vegetable = Category(name="index-vegetable")
+        db.session.add(vegetable)
+        db.session.flush()
+        db.session.execute(
+            update(Product).where(Product.id == 9002)
+            .values(price=Decimal("3.00"), category_names=["index-vegetable"], catalog_version=3)
+        )
+        db.session.execute(
+            update(ProductCategory).where(ProductCategory.product_id == 9002).values(category_id=vegetable.id)
+        )
+        set_version(3)
+        db.session.commit()
+        SearchIndex.refresh()
+
+        categories, products = SearchIndex.search("index-apple", "index")
+        assert categories == ["index-vegetable"]
+        assert products == [{"categories": ["index-vegetable"], "id": 9002, "name": "index-apple", "price": 3.0}]
@@ -0,0 +1,59 @@
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from sqlalchemy import event
+
+from ORM import db, Product, Order, OrderProduct
+
+
+def add_orders(email, count):
+    products = [Product(name=f"{email}-{i}", price=Decimal("10.00"), category_names=["Test"]) for i in range(2)]
+    db.session.add_all(products)
+    db.session.flush()
+    start = datetime(2024, 1, 1)
+    for i in range(count):
+        order = Order(email=email, status="CREATED", timestamp=start + timedelta(minutes=i), deploy_status="DEPLOYED")
+        db.session.add(order)
+        db.session.flush()
+        for product in products:
+            db.session.add(OrderProduct(
+                order_id=order.id, product_id=product.id, quantity=2,
+                unit_price=product.price, product_name=product.name, category_names=["Test"]
+            ))
+    db.session.commit()
+
+
+def count_queries(app, path):
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        response = app.test_client().get(path)
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+    return response, statements
+
+
+def test_status_query_count_does_not_grow_with_orders(app, login):
+    n = 5
+    with app.app_context():
+        add_orders("few@test.com", n)
+        add_orders("many@test.com", 10 * n)
+
+    login("few@test.com")
+    few, few_queries = count_queries(app, "/status")
+    login("many@test.com")
+    many, many_queries = count_queries(app, "/status")
+
+    assert few.status_code == 200 and many.status_code == 200
+    assert len(few.get_json()["orders"]) == n
+    assert len(many.get_json()["orders"]) == 10 * n
+    assert all(len(o["products"]) == 2 for o in many.get_json()["orders"])
+    assert len(many_queries) == len(few_queries)
+    # narudžbine + stavke (selectinload), bez čitanja product/category tabela
+    assert len(few_queries) == 2
@@ -1,6 +1,150 @@
+import os
+import threading
+import time
+from functools import wraps
+
+from flask import g, has_app_context
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
+from sqlalchemy import select, insert, update, delete, func, case, text
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.exc import OperationalError, TimeoutError
+from sqlalchemy.pool import QueuePool
+
+from cache import TTLCache
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool koji broji checkout-e i meri koliko se čekalo na konekciju."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats_lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except TimeoutError:
+            with self.stats_lock:
+                self.timeouts += 1
+            raise
+        finally:
+            waited = time.perf_counter() - start
+            with self.stats_lock:
+                self.checkouts += 1
+                self.wait_total += waited
+                self.wait_max = max(self.wait_max, waited)
+
+    def stats(self):
+        with self.stats_lock:
+            return {
+                "size": self.size(),
+                "checked_in": self.checkedin(),
+                "checked_out": self.checkedout(),
+                "overflow": self.overflow(),
+                "max_overflow": self._max_overflow,
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "wait_avg_ms": self.wait_total / self.checkouts * 1000 if self.checkouts else 0.0,
+                "wait_max_ms": self.wait_max * 1000
+            }
+
+
+def engine_options():
+    # Podešavanja bazena konekcija iz okruženja; recycle mora biti manji od MySQL wait_timeout
+    return {
+        "poolclass": TimedQueuePool,
+        "pool_size": int(os.getenv("DB_POOL_SIZE", "10")),
+        "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "20")),
+        "pool_timeout": float(os.getenv("DB_POOL_TIMEOUT", "10")),
+        "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", "280")),
+        "pool_pre_ping": os.getenv("DB_POOL_PRE_PING", "1") == "1"
+    }
+
+
+class Replica:
+    """
+    Usmeravanje čitanja na repliku baze (bind "replica", DB_REPLICA_ADDR).
+    Samo rute označene sa read_replica čitaju sa replike, upisi (flush) uvek
+    idu na primarnu bazu. Ako replika nije podešena ili ne odgovara, čita se
+    sa primarne; posle greške se replika preskače cooldown sekundi.
+    """
+    bind_key = "replica"
+    cooldown = float(os.getenv("DB_REPLICA_COOLDOWN", "30"))
+    down_until = 0.0
+    # kupci koji su nedavno pisali čitaju svoje podatke sa primarne (read-after-write)
+    recent_writes = TTLCache(10000, float(os.getenv("DB_REPLICA_STICKY", "5")))
+
+    @staticmethod
+    def selected():
+        return (
+            has_app_context()
+            and g.get("db_replica", False)
+            and Replica.bind_key in db.engines
+            and time.monotonic() >= Replica.down_until
+        )
+
+    @staticmethod
+    def use_primary():
+        g.db_replica = False
+
+    @staticmethod
+    def mark_write(email):
+        Replica.recent_writes.put(email, True)
+
+    @staticmethod
+    def wrote_recently(email):
+        return Replica.recent_writes.get(email) is not None
+
+
+class RoutingSession(Session):
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and Replica.selected():
+            return db.engines[Replica.bind_key]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def read_replica(view):
+    # Ruta samo čita; ako replika padne, zahtev se ponavlja nad primarnom bazom
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        g.db_replica = True
+        if not Replica.selected():
+            return view(*args, **kwargs)
+        try:
+            return view(*args, **kwargs)
+        except OperationalError as e:
+            print(f"Read replica unavailable, using primary: {e}")
+            db.session.rollback()
+            Replica.down_until = time.monotonic() + Replica.cooldown
+            Replica.use_primary()
+            return view(*args, **kwargs)
+    return wrapper
+
+
+db = SQLAlchemy(session_options={"class_": RoutingSession})
 
-db = SQLAlchemy()
+
+def pool_stats():
+    # Stanje bazena po bind-u: None je primarna baza
+    return {
+        "primary" if key is None else key: engine.pool.stats() if hasattr(engine.pool, "stats") else engine.pool.status()
+        for key, engine in db.engines.items()
+    }
+
+
+def db_ready():
+    try:
+        db.session.execute(text("SELECT 1"))
+        return True
+    except Exception:
+        db.session.rollback()
+        return False
 
 
 class Product(db.Model):
@@ -9,6 +153,10 @@ class Product(db.Model):
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     name = db.Column(db.String(100), nullable=False, unique=True)
     price = db.Column(db.Numeric(10, 2), nullable=False)
+    # sortirana imena kategorija; održava ih /update, pa čitanja ne učitavaju product_category
+    category_names = db.Column(db.JSON, nullable=True)
+    # verzija kataloga poslednje izmene (sync /update), po njoj indeks pretrage vidi izmene
+    catalog_version = db.Column(db.BigInteger, nullable=False, default=0)
 
     categories = db.relationship(
         "Category",
@@ -50,7 +198,24 @@ class Order(db.Model):
     )
     timestamp = db.Column(db.DateTime, nullable=False)
     #dodatno polje za contract_id
-    contract_address = db.Column(db.String(150), nullable=False)
+    contract_address = db.Column(db.String(150), nullable=True)
+    # stanje deploy-a ugovora: DEPLOYING -> DEPLOYED ili FAILED
+    deploy_status = db.Column(
+        db.Enum("DEPLOYING", "DEPLOYED", "FAILED", name="deploy_status"),
+        nullable=False,
+        default="DEPLOYED"
+    )
+    deploy_tx_hash = db.Column(db.String(80), nullable=True)
+    deploy_error = db.Column(db.String(255), nullable=True)
+    # PER_ORDER: ugovor po narudžbini, CLONE: minimalni proxy po narudžbini,
+    # REGISTRY: stavka u OrderBook ugovoru
+    contract_mode = db.Column(
+        db.Enum("PER_ORDER", "CLONE", "REGISTRY", name="contract_mode"),
+        nullable=False,
+        default="PER_ORDER"
+    )
+    # ukupna cena u trenutku kreiranja narudžbine
+    total_price = db.Column(db.Numeric(12, 2), nullable=True)
 
     products = db.relationship("OrderProduct", back_populates="order")
 
@@ -61,6 +226,333 @@ class OrderProduct(db.Model):
     order_id = db.Column(db.Integer, db.ForeignKey("order.id"), primary_key=True)
     product_id = db.Column(db.Integer, db.ForeignKey("product.id"), primary_key=True)
     quantity = db.Column(db.Integer, nullable=False)
+    # snimak proizvoda u trenutku kupovine, /status ne čita tabele product i category
+    unit_price = db.Column(db.Numeric(10, 2), nullable=True)
+    product_name = db.Column(db.String(100), nullable=True)
+    category_names = db.Column(db.JSON, nullable=True)
 
     order = db.relationship("Order", back_populates="products")
     product = db.relationship("Product", back_populates="orders")
+
+
+class ProductSales(db.Model):
+    __tablename__ = "product_sales"
+
+    # zbir količina po proizvodu i statusu narudžbine; menja se u istoj transakciji kao i status
+    product_id = db.Column(db.Integer, db.ForeignKey("product.id"), primary_key=True)
+    waiting = db.Column(db.BigInteger, nullable=False, default=0)
+    in_transit = db.Column(db.BigInteger, nullable=False, default=0)
+    sold = db.Column(db.BigInteger, nullable=False, default=0)
+
+    columns = {"CREATED": "waiting", "PENDING": "in_transit", "COMPLETE": "sold"}
+
+    @staticmethod
+    def add(quantities):
+        # Nova narudžbina (CREATED); redovi se zaključavaju po rastućem product_id zbog deadlock-a
+        if not quantities:
+            return
+        stmt = mysql_insert(ProductSales).values([
+            {"product_id": pid, "waiting": quantity, "in_transit": 0, "sold": 0}
+            for pid, quantity in sorted(quantities.items())
+        ])
+        db.session.execute(stmt.on_duplicate_key_update(waiting=ProductSales.waiting + stmt.inserted.waiting))
+
+    @staticmethod
+    def fail(order_id, error):
+        # Deploy nije uspeo: narudžbina se više ne računa kao čekajuća (kao da nije ni kreirana)
+        failed = db.session.execute(
+            update(Order)
+            .where(Order.id == order_id, Order.deploy_status == "DEPLOYING")
+            .values(deploy_status="FAILED", deploy_error=error)
+        ).rowcount == 1
+        if failed:
+            db.session.execute(
+                update(ProductSales)
+                .where(ProductSales.product_id == OrderProduct.product_id, OrderProduct.order_id == order_id)
+                .values(waiting=ProductSales.waiting - OrderProduct.quantity)
+                .execution_options(synchronize_session=False)
+            )
+        return failed
+
+    @staticmethod
+    def move(order_id, from_status, to_status):
+        # Prelaz statusa narudžbine sa pomeranjem količina; False ako je status već promenjen
+        moved = db.session.execute(
+            update(Order)
+            .where(Order.id == order_id, Order.status == from_status)
+            .values(status=to_status)
+        ).rowcount == 1
+        if moved:
+            source = getattr(ProductSales, ProductSales.columns[from_status])
+            target = getattr(ProductSales, ProductSales.columns[to_status])
+            db.session.execute(
+                update(ProductSales)
+                .where(ProductSales.product_id == OrderProduct.product_id, OrderProduct.order_id == order_id)
+                .values({source.key: source - OrderProduct.quantity, target.key: target + OrderProduct.quantity})
+                .execution_options(synchronize_session=False)
+            )
+            if to_status == "COMPLETE":
+                CategorySales.add_delivered(order_id)
+        return moved
+
+    @staticmethod
+    def aggregate():
+        # Isti zbir direktno iz order_product i order, za rebuild i proveru
+        return (
+            select(
+                OrderProduct.product_id,
+                func.sum(case((Order.status == "CREATED", OrderProduct.quantity), else_=0)).label("waiting"),
+                func.sum(case((Order.status == "PENDING", OrderProduct.quantity), else_=0)).label("in_transit"),
+                func.sum(case((Order.status == "COMPLETE", OrderProduct.quantity), else_=0)).label("sold")
+            )
+            .join(Order, Order.id == OrderProduct.order_id)
+            .where(Order.deploy_status != "FAILED")
+            .group_by(OrderProduct.product_id)
+        )
+
+    @staticmethod
+    def rebuild():
+        db.session.execute(delete(ProductSales))
+        db.session.execute(
+            insert(ProductSales).from_select(
+                ["product_id", "waiting", "in_transit", "sold"], ProductSales.aggregate()
+            )
+        )
+        db.session.commit()
+
+    @staticmethod
+    def check():
+        # Lista (product_id, rollup, izračunato) za proizvode gde se zbirovi razlikuju
+        expected = {
+            product_id: (int(waiting), int(in_transit), int(sold))
+            for product_id, waiting, in_transit, sold in db.session.execute(ProductSales.aggregate()).all()
+        }
+        stored = {
+            product_id: (waiting, in_transit, sold)
+            for product_id, waiting, in_transit, sold in db.session.execute(
+                select(ProductSales.product_id, ProductSales.waiting, ProductSales.in_transit, ProductSales.sold)
+            ).all()
+        }
+        mismatches = []
+        for product_id in sorted(set(expected) | set(stored)):
+            want = expected.get(product_id, (0, 0, 0))
+            have = stored.get(product_id, (0, 0, 0))
+            if want != have:
+                mismatches.append((product_id, have, want))
+        return mismatches
+
+
+class CategorySales(db.Model):
+    __tablename__ = "category_sales"
+
+    # isporučene količine (COMPLETE narudžbine) po kategoriji, po trenutnim vezama product_category
+    category_id = db.Column(db.Integer, db.ForeignKey("category.id"), primary_key=True)
+    delivered = db.Column(db.BigInteger, nullable=False, default=0)
+
+    @staticmethod
+    def _upsert(stmt):
+        db.session.execute(stmt.on_duplicate_key_update(delivered=CategorySales.delivered + stmt.inserted.delivered))
+
+    @staticmethod
+    def add_delivered(order_id):
+        # Zbir po kategoriji pre upisa: višetabelarni UPDATE bi isti red kategorije menjao samo jednom
+        per_category = (
+            select(ProductCategory.category_id, func.sum(OrderProduct.quantity).label("delivered"))
+            .join(OrderProduct, OrderProduct.product_id == ProductCategory.product_id)
+            .where(OrderProduct.order_id == order_id)
+            .group_by(ProductCategory.category_id)
+        )
+        CategorySales._upsert(mysql_insert(CategorySales).from_select(["category_id", "delivered"], per_category))
+
+    @staticmethod
+    def relink(added, removed):
+        # Proizvod je dobio ili izgubio kategoriju: njegova prodata količina prelazi sa vezom
+        product_ids = {product_id for product_id, _ in added} | {product_id for product_id, _ in removed}
+        if not product_ids:
+            return
+        sold = dict(db.session.execute(
+            select(ProductSales.product_id, ProductSales.sold)
+            .where(ProductSales.product_id.in_(list(product_ids)), ProductSales.sold > 0)
+            .with_for_update(read=True)
+        ).all())
+        delta = {}
+        for pairs, sign in ((added, 1), (removed, -1)):
+            for product_id, category_id in pairs:
+                if product_id in sold:
+                    delta[category_id] = delta.get(category_id, 0) + sign * sold[product_id]
+        rows = [{"category_id": category_id, "delivered": d} for category_id, d in sorted(delta.items()) if d]
+        if rows:
+            CategorySales._upsert(mysql_insert(CategorySales).values(rows))
+
+    @staticmethod
+    def ranking():
+        # Imena svih kategorija po isporučenoj količini, pa po imenu (kao ranije /category_statistics)
+        delivered = func.coalesce(CategorySales.delivered, 0)
+        return list(db.session.execute(
+            select(Category.name)
+            .outerjoin(CategorySales, CategorySales.category_id == Category.id)
+            .order_by(delivered.desc(), Category.name.asc())
+        ).scalars())
+
+    @staticmethod
+    def aggregate():
+        return (
+            select(
+                ProductCategory.category_id,
+                func.sum(case((Order.status == "COMPLETE", OrderProduct.quantity), else_=0)).label("delivered")
+            )
+            .join(OrderProduct, OrderProduct.product_id == ProductCategory.product_id)
+            .join(Order, Order.id == OrderProduct.order_id)
+            .group_by(ProductCategory.category_id)
+        )
+
+    @staticmethod
+    def rebuild():
+        db.session.execute(delete(CategorySales))
+        db.session.execute(
+            insert(CategorySales).from_select(["category_id", "delivered"], CategorySales.aggregate())
+        )
+        db.session.commit()
+
+    @staticmethod
+    def check():
+        # Lista (category_id, rollup, izračunato) za kategorije gde se zbirovi razlikuju
+        expected = {
+            category_id: int(delivered)
+            for category_id, delivered in db.session.execute(CategorySales.aggregate()).all()
+        }
+        stored = dict(db.session.execute(select(CategorySales.category_id, CategorySales.delivered)).all())
+        return [
+            (category_id, stored.get(category_id, 0), expected.get(category_id, 0))
+            for category_id in sorted(set(expected) | set(stored))
+            if stored.get(category_id, 0) != expected.get(category_id, 0)
+        ]
+
+
+class IdempotencyKey(db.Model):
+    __tablename__ = "idempotency_key"
+
+    # Idempotency-Key zaglavlje za POST /order, po kupcu; PENDING dok prvi zahtev traje
+    email = db.Column(db.String(150), primary_key=True)
+    idempotency_key = db.Column(db.String(128), primary_key=True)
+    request_hash = db.Column(db.String(64), nullable=False)
+    status = db.Column(
+        db.Enum("PENDING", "DONE", name="idempotency_status"),
+        nullable=False,
+        default="PENDING"
+    )
+    response_status = db.Column(db.Integer, nullable=True)
+    response_body = db.Column(db.Text, nullable=True)
+    expires_at = db.Column(db.DateTime, nullable=False)
+
+
+class NonceReservation(db.Model):
+    __tablename__ = "nonce_reservation"
+
+    # sledeći slobodan nonce za nalog, deljen između servisa
+    account = db.Column(db.String(42), primary_key=True)
+    next_nonce = db.Column(db.BigInteger, nullable=False, default=0)
+
+
+class DeployedContract(db.Model):
+    __tablename__ = "deployed_contract"
+
+    # dugovečni ugovori (npr. OrderBook) koji se deploy-uju jednom za sve servise
+    name = db.Column(db.String(50), primary_key=True)
+    address = db.Column(db.String(42), nullable=True)
+
+    @staticmethod
+    def get_or_deploy(name, deploy):
+        # Red se zaključava pa samo jedan proces deploy-uje ugovor
+        locked = (
+            select(DeployedContract.address)
+            .where(DeployedContract.name == name)
+            .with_for_update()
+        )
+        with db.engine.begin() as conn:
+            conn.execute(insert(DeployedContract).prefix_with("IGNORE").values(name=name, address=None))
+            address = conn.execute(locked).scalar()
+            if address is None:
+                address = deploy()
+                conn.execute(
+                    update(DeployedContract)
+                    .where(DeployedContract.name == name)
+                    .values(address=address)
+                )
+        return address
+
+
+class ChainCursor(db.Model):
+    __tablename__ = "chain_cursor"
+
+    # poslednji blok koji je indekser obradio
+    name = db.Column(db.String(50), primary_key=True)
+    block_number = db.Column(db.BigInteger, nullable=False)
+    updated_at = db.Column(db.DateTime, nullable=False)
+
+
+class OrderChainState(db.Model):
+    __tablename__ = "order_chain_state"
+
+    # stanje narudžbine na lancu, popunjava ga indekser iz događaja ugovora
+    order_id = db.Column(db.Integer, db.ForeignKey("order.id"), primary_key=True)
+    paid = db.Column(db.Boolean, nullable=False, default=False)
+    paid_amount = db.Column(db.Numeric(38, 0), nullable=True)
+    paid_block = db.Column(db.BigInteger, nullable=True)
+    courier = db.Column(db.String(42), nullable=True)
+    courier_block = db.Column(db.BigInteger, nullable=True)
+    delivered = db.Column(db.Boolean, nullable=False, default=False)
+    delivered_block = db.Column(db.BigInteger, nullable=True)
+
+    @staticmethod
+    def indexed(order_id):
+        if order_id is None:
+            return None
+        return db.session.get(OrderChainState, order_id)
+
+
+class CatalogVersion(db.Model):
+    __tablename__ = "catalog_version"
+
+    # brojač izmena kataloga; keševi pretrage važe samo za verziju pod kojom su napravljeni
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.BigInteger, nullable=False, default=0)
+
+    @staticmethod
+    def current(name="catalog"):
+        version = db.session.execute(
+            select(CatalogVersion.version).where(CatalogVersion.name == name)
+        ).scalar()
+        return version or 0
+
+    @staticmethod
+    def bump(name="catalog"):
+        # Izvršava se u tekućoj transakciji, pa nova verzija postaje vidljiva tek sa commit-om izmena
+        stmt = mysql_insert(CatalogVersion).values(name=name, version=1)
+        db.session.execute(stmt.on_duplicate_key_update(version=CatalogVersion.version + 1))
+        return CatalogVersion.current(name)
+
+
+class ImportJob(db.Model):
+    __tablename__ = "import_job"
+
+    # asinhroni /update: CSV je sačuvan na disku, radnik ga uvozi u jednoj transakciji
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    email = db.Column(db.String(150), nullable=False)
+    status = db.Column(
+        db.Enum("QUEUED", "RUNNING", "DONE", "FAILED", name="import_job_status"),
+        nullable=False,
+        default="QUEUED"
+    )
+    path = db.Column(db.String(255), nullable=False)
+    rows_validated = db.Column(db.Integer, nullable=False, default=0)
+    rows_written = db.Column(db.Integer, nullable=False, default=0)
+    # sync režim: izveštaj o dodatim, izmenjenim i nepromenjenim proizvodima
+    mode = db.Column(db.Enum("INSERT", "SYNC", name="import_job_mode"), nullable=False, default="INSERT")
+    added = db.Column(db.Integer, nullable=True)
+    changed = db.Column(db.Integer, nullable=True)
+    unchanged = db.Column(db.Integer, nullable=True)
+    error = db.Column(db.String(255), nullable=True)
+    error_line = db.Column(db.Integer, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False)
+    finished_at = db.Column(db.DateTime, nullable=True)
@@ -0,0 +1,68 @@
+// SPDX-License-Identifier: MIT
+pragma solidity ^0.8.0;
+
+// Jedan ugovor za sve narudžbine, stavke su ključirane id-jem narudžbine iz baze.
+contract OrderBook {
+    struct Entry {
+        address customer;
+        uint256 price;
+        address courier;
+        bool paid;
+        bool delivered;
+        bool exists;
+    }
+
+    address public owner;
+    mapping(uint256 => Entry) public orders;
+
+    event OrderCreated(uint256 indexed orderId, address indexed customer, uint256 price);
+    event Paid(uint256 indexed orderId, address indexed customer, uint256 amount);
+    event CourierAssigned(uint256 indexed orderId, address indexed courier);
+    event DeliveryConfirmed(uint256 indexed orderId, address indexed customer, uint256 ownerShare, uint256 courierShare);
+
+    modifier onlyOwner() {
+        require(msg.sender == owner, "Only owner.");
+        _;
+    }
+
+    constructor() {
+        owner = msg.sender;
+    }
+
+    function createOrder(uint256 orderId, address customer, uint256 price) external onlyOwner {
+        require(!orders[orderId].exists, "Order already exists.");
+        orders[orderId] = Entry(customer, price, address(0), false, false, true);
+        emit OrderCreated(orderId, customer, price);
+    }
+
+    function pay(uint256 orderId) external payable {
+        Entry storage entry = orders[orderId];
+        require(entry.exists, "Unknown order.");
+        require(msg.sender == entry.customer, "Only customer.");
+        require(!entry.paid, "Transfer already complete.");
+        require(msg.value == entry.price, "Incorrect amount.");
+        entry.paid = true;
+        emit Paid(orderId, msg.sender, msg.value);
+    }
+
+    function assignCourier(uint256 orderId, address courier) external onlyOwner {
+        Entry storage entry = orders[orderId];
+        require(entry.paid, "Transfer not complete.");
+        require(entry.courier == address(0), "Courier already assigned.");
+        entry.courier = courier;
+        emit CourierAssigned(orderId, courier);
+    }
+
+    function confirmDelivery(uint256 orderId) external onlyOwner {
+        Entry storage entry = orders[orderId];
+        require(entry.courier != address(0), "Delivery not complete.");
+        require(!entry.delivered, "Delivery already confirmed.");
+        entry.delivered = true;
+
+        uint256 ownerShare = (entry.price * 80) / 100;
+        uint256 courierShare = entry.price - ownerShare;
+        payable(owner).transfer(ownerShare);
+        payable(entry.courier).transfer(courierShare);
+        emit DeliveryConfirmed(orderId, entry.customer, ownerShare, courierShare);
+    }
+}
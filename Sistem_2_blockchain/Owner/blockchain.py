@@ -1,153 +1,1056 @@
 import json
+import os
 import secrets
+import threading
+import time
+from functools import wraps
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
 
+import requests
 import web3
 from eth_account import Account
 from solcx import install_solc, set_solc_version, compile_standard
 import json
 from web3 import Web3, HTTPProvider
-from web3.exceptions import ContractLogicError
+from web3._utils.http_session_manager import HTTPSessionManager
+from web3.exceptions import ContractLogicError, TimeExhausted, TransactionNotFound
+from web3.providers.rpc.utils import ExceptionRetryConfiguration
+from sqlalchemy import select, insert, update
 
+from ORM import db, NonceReservation, DeployedContract, OrderChainState
+from cache import LRUCache, TTLCache
 
-def compile_contract():
+
+def compile_contract(source_file="Contract.sol", contract_name="OrderContract", output_file="Contract.json"):
     install_solc('0.8.0')
 
     set_solc_version('0.8.0')
 
-    with open("Contract.sol", "r") as f:
+    with open(source_file, "r") as f:
         source_code = f.read()
 
     compiled_sol = compile_standard({
         "language": "Solidity",
-        "sources": {"Contract.sol": {"content": source_code}},
+        "sources": {source_file: {"content": source_code}},
         "settings": {"outputSelection": {"*": {"*": ["abi", "evm.bytecode.object"]}}}
     })
 
-    contract_name = "OrderContract"
-    abi = compiled_sol['contracts']['Contract.sol'][contract_name]['abi']
-    bytecode = compiled_sol['contracts']['Contract.sol'][contract_name]['evm']['bytecode']['object']
+    abi = compiled_sol['contracts'][source_file][contract_name]['abi']
+    bytecode = compiled_sol['contracts'][source_file][contract_name]['evm']['bytecode']['object']
 
-    with open("Contract.json", "w") as f:
+    with open(output_file, "w") as f:
         json.dump({"abi": abi, "bytecode": bytecode}, f, indent=4)
 
+    return {"abi": abi, "bytecode": bytecode}
+
+
+def compile_artifacts(contract_names=("OrderBook", "OrderFactory")):
+    # Poziva se pri build-u image-a (Dockerfile), ne u radu servisa: solc se
+    # preuzima sa mreže, a kompajliranje ne sme da drži radnike
+    for contract_name in contract_names:
+        if not os.path.exists(f"{contract_name}.json"):
+            compile_contract(f"{contract_name}.sol", contract_name, f"{contract_name}.json")
+
+
+artifact_lock = threading.Lock()
+artifacts = {}
+
+
+def load_artifact(contract_name):
+    with artifact_lock:
+        if contract_name not in artifacts:
+            output_file = f"{contract_name}.json"
+            if not os.path.exists(output_file):
+                raise FileNotFoundError(f"{output_file} is missing, run blockchain.compile_artifacts() first.")
+            with open(output_file, "r") as f:
+                artifacts[contract_name] = json.load(f)
+        return artifacts[contract_name]
+
+
+class ChainUnavailable(Exception):
+    """Čvor nije dostupan ili je prekidač otvoren; rute ga vraćaju kao 503."""
+
+    def __init__(self, message="Blockchain unavailable."):
+        super().__init__(message)
+
+
+class ChainDeadlineExceeded(ChainUnavailable):
+    def __init__(self, message="Blockchain request timed out."):
+        super().__init__(message)
+
+
+class ChainBreaker:
+    """
+    Prekidač oko svih RPC poziva procesa. Posle failure_threshold uzastopnih
+    mrežnih grešaka (konekcija, timeout, 5xx) se otvara i pozivi odmah padaju
+    sa ChainUnavailable. Posle cooldown sekundi propušta half_open_probes
+    probnih poziva: uspeh ga zatvara, a svaki drugi ishod (greška, istekao rok)
+    ga ponovo otvara.
+    """
+    failure_threshold = int(os.getenv("BREAKER_FAILURES", "5"))
+    cooldown = float(os.getenv("BREAKER_COOLDOWN", "10"))
+    half_open_probes = int(os.getenv("BREAKER_HALF_OPEN_PROBES", "1"))
+    lock = threading.Lock()
+    state = "CLOSED"
+    failures = 0
+    opened_at = 0.0
+    probes = 0
+    counters = {"calls": 0, "failures": 0, "rejected": 0, "opened": 0}
+
+    @staticmethod
+    def before_call():
+        with ChainBreaker.lock:
+            if ChainBreaker.state == "OPEN":
+                if time.monotonic() - ChainBreaker.opened_at < ChainBreaker.cooldown:
+                    ChainBreaker.counters["rejected"] += 1
+                    raise ChainUnavailable()
+                ChainBreaker.state = "HALF_OPEN"
+                ChainBreaker.probes = 0
+            if ChainBreaker.state == "HALF_OPEN":
+                if ChainBreaker.probes >= ChainBreaker.half_open_probes:
+                    ChainBreaker.counters["rejected"] += 1
+                    raise ChainUnavailable()
+                ChainBreaker.probes += 1
+            ChainBreaker.counters["calls"] += 1
+            # True ako je poziv probni
+            return ChainBreaker.state == "HALF_OPEN"
+
+    @staticmethod
+    def record_success():
+        with ChainBreaker.lock:
+            ChainBreaker.failures = 0
+            if ChainBreaker.state == "HALF_OPEN":
+                ChainBreaker.state = "CLOSED"
+                print("Blockchain circuit breaker closed")
+
+    @staticmethod
+    def record_failure():
+        with ChainBreaker.lock:
+            ChainBreaker.failures += 1
+            ChainBreaker.counters["failures"] += 1
+            if ChainBreaker.state == "HALF_OPEN" or (
+                    ChainBreaker.state == "CLOSED" and ChainBreaker.failures >= ChainBreaker.failure_threshold):
+                ChainBreaker.state = "OPEN"
+                ChainBreaker.opened_at = time.monotonic()
+                ChainBreaker.counters["opened"] += 1
+                print(f"Blockchain circuit breaker opened after {ChainBreaker.failures} failures")
+
+    @staticmethod
+    def stats():
+        with ChainBreaker.lock:
+            return {
+                "state": ChainBreaker.state,
+                "consecutive_failures": ChainBreaker.failures,
+                "failure_threshold": ChainBreaker.failure_threshold,
+                "cooldown": ChainBreaker.cooldown,
+                **ChainBreaker.counters
+            }
+
+
+class Deadline:
+    """
+    Rok za operaciju nad ugovorom (čitanja, slanje i čekanje potvrde), po niti.
+    Svaki RPC poziv dobija timeout najviše do isteka roka. Istek roka posle
+    slanja nije greška: OrderContract.await_sent vraća "submitted" rezultat.
+    """
+    seconds = float(os.getenv("CHAIN_DEADLINE", "15"))
+    local = threading.local()
+
+    @staticmethod
+    def remaining():
+        at = getattr(Deadline.local, "at", None)
+        return None if at is None else at - time.monotonic()
+
+    @staticmethod
+    def expired():
+        remaining = Deadline.remaining()
+        return remaining is not None and remaining <= 0
+
+
+def with_deadline(fn):
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        # Ugnježdeni pozivi dele rok spoljašnje operacije
+        if getattr(Deadline.local, "at", None) is not None:
+            return fn(*args, **kwargs)
+        Deadline.local.at = time.monotonic() + Deadline.seconds
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            Deadline.local.at = None
+    return wrapper
+
+
+class SharedSessionManager(HTTPSessionManager):
+    """
+    HTTPSessionManager čuva sesiju po niti, pa bi zajednička sesija (i njen bazen
+    konekcija) važila samo za nit koja je napravila provider; ovde je dele sve niti.
+    """
+
+    def __init__(self, session):
+        super().__init__()
+        self.session = session
+
+    def cache_and_return_session(self, endpoint_uri, session=None, request_timeout=None):
+        return self.session
+
+
+class GuardedHTTPProvider(HTTPProvider):
+    """HTTPProvider koji svaki zahtev (i batch) propušta kroz ChainBreaker i Deadline."""
+
+    def __init__(self, endpoint_uri, session, **kwargs):
+        super().__init__(endpoint_uri, **kwargs)
+        self._request_session_manager = SharedSessionManager(session)
+
+    def get_request_kwargs(self):
+        kwargs = dict(super().get_request_kwargs())
+        remaining = Deadline.remaining()
+        if remaining is not None and "timeout" in kwargs:
+            connect_timeout, read_timeout = kwargs["timeout"]
+            kwargs["timeout"] = (min(connect_timeout, remaining), min(read_timeout, remaining))
+        return kwargs
+
+    def make_request(self, method, params):
+        return self.guarded(super().make_request, method, params)
+
+    def make_batch_request(self, batch_requests):
+        return self.guarded(super().make_batch_request, batch_requests)
+
+    @staticmethod
+    def guarded(call, *args):
+        if Deadline.expired():
+            raise ChainDeadlineExceeded()
+        probe = ChainBreaker.before_call()
+        settled = False
+        try:
+            response = call(*args)
+            # Odgovor sa RPC greškom (revert, nonce) znači da čvor radi
+            ChainBreaker.record_success()
+            settled = True
+            return response
+        except requests.exceptions.RequestException as e:
+            if Deadline.expired():
+                # timeout skraćen rokom operacije ne znači da je čvor pao
+                raise ChainDeadlineExceeded() from e
+            ChainBreaker.record_failure()
+            settled = True
+            raise ChainUnavailable() from e
+        finally:
+            if probe and not settled:
+                # probni poziv bez odgovora čvora ne sme trajno da zauzme mesto probe
+                ChainBreaker.record_failure()
+
+
+web3_lock = threading.Lock()
+web3_instance = None
+
+
+def get_web3():
+    # Provider se pravi pri prvom korišćenju, sa keep-alive sesijom i ograničenim bazenom konekcija.
+    # Ponovni pokušaji su podrazumevano isključeni jer otkaze čvora obrađuje ChainBreaker.
+    global web3_instance
+    with web3_lock:
+        if web3_instance is None:
+            pool_size = int(os.getenv("WEB3_POOL_SIZE", "20"))
+            adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+            session = requests.Session()
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            retries = int(os.getenv("WEB3_RETRIES", "0"))
+            provider = GuardedHTTPProvider(
+                os.getenv("WEB3_PROVIDER", "http://ganache:8545"),
+                session=session,
+                request_kwargs={"timeout": (
+                    float(os.getenv("WEB3_CONNECT_TIMEOUT", "3")),
+                    float(os.getenv("WEB3_READ_TIMEOUT", "10"))
+                )},
+                exception_retry_configuration=ExceptionRetryConfiguration(retries=retries) if retries > 0 else None
+            )
+            web3_instance = Web3(provider)
+        return web3_instance
+
+
+class LazyWeb3:
+    def __get__(self, obj, owner):
+        return get_web3()
+
+
+class LazyArtifact:
+    def __init__(self, contract_name, field):
+        self.contract_name = contract_name
+        self.field = field
+
+    def __get__(self, obj, owner):
+        return load_artifact(self.contract_name)[self.field]
+
+
+
+class NonceManager:
+    """
+    Dodeljuje rastuće nonce-ove za owner nalog pod lock-om, bez čekanja potvrde
+    prethodne transakcije. U "db" režimu sledeći nonce se rezerviše u tabeli
+    nonce_reservation (SELECT ... FOR UPDATE), pa ga dele Owner/Customer/Courier
+    procesi. Čvor se pita samo pri prvoj dodeli u procesu i posle greške.
+    """
+    store = os.getenv("NONCE_STORE", "db")
+    lock = threading.Lock()
+    next_nonce = {}
+    synced = set()
+    stale = set()
+
+    @staticmethod
+    def allocate(account):
+        with NonceManager.lock:
+            if NonceManager.store == "db":
+                nonce = NonceManager._allocate_db(account)
+            else:
+                nonce = NonceManager._allocate_local(account)
+            NonceManager.synced.add(account)
+            NonceManager.stale.discard(account)
+            return nonce
+
+    @staticmethod
+    def reset(account):
+        # Posle nonce greške, neuspelog slanja ili transakcije koja nije stigla u lanac
+        # brojač se ponovo čita sa čvora; tako se popunjava rupa od izgubljenog nonce-a
+        with NonceManager.lock:
+            NonceManager.stale.add(account)
+
+    @staticmethod
+    def release(account, nonce):
+        # Nonce transakcije koja nije ni poslata se vraća, ali samo ako posle njega
+        # niko nije dobio sledeći; inače bi dva zahteva dobila isti nonce
+        with NonceManager.lock:
+            if NonceManager.store == "db":
+                with db.engine.begin() as conn:
+                    conn.execute(
+                        update(NonceReservation)
+                        .where(NonceReservation.account == account, NonceReservation.next_nonce == nonce + 1)
+                        .values(next_nonce=nonce)
+                    )
+            elif NonceManager.next_nonce.get(account) == nonce + 1:
+                NonceManager.next_nonce[account] = nonce
+
+    @staticmethod
+    def is_nonce_error(error):
+        return "nonce" in str(error).lower()
+
+    @staticmethod
+    def _chain_nonce(account):
+        return OrderContract.w3.eth.get_transaction_count(account, "pending")
+
+    @staticmethod
+    def _allocate_local(account):
+        if account in NonceManager.stale or account not in NonceManager.next_nonce:
+            NonceManager.next_nonce[account] = NonceManager._chain_nonce(account)
+        nonce = NonceManager.next_nonce[account]
+        NonceManager.next_nonce[account] = nonce + 1
+        return nonce
+
+    @staticmethod
+    def _allocate_db(account):
+        reserved = (
+            select(NonceReservation.next_nonce)
+            .where(NonceReservation.account == account)
+            .with_for_update()
+        )
+        with db.engine.begin() as conn:
+            nonce = conn.execute(reserved).scalar()
+            if nonce is None:
+                conn.execute(
+                    insert(NonceReservation).prefix_with("IGNORE").values(account=account, next_nonce=0)
+                )
+                nonce = conn.execute(reserved).scalar_one()
+
+            if account in NonceManager.stale:
+                nonce = NonceManager._chain_nonce(account)
+            elif account not in NonceManager.synced:
+                # Pri pokretanju ne spuštamo brojač ispod rezervacija drugih procesa
+                nonce = max(nonce, NonceManager._chain_nonce(account))
+
+            conn.execute(
+                update(NonceReservation)
+                .where(NonceReservation.account == account)
+                .values(next_nonce=nonce + 1)
+            )
+        return nonce
+
+
+class ReadBatch:
+    """
+    Nezavisna čitanja koja call site deklariše zajedno šalju se kao jedan
+    JSON-RPC batch, tj. jedan odlazak do čvora. Svako čitanje je funkcija bez
+    argumenata koja vraća web3 poziv, npr. lambda: w3.eth.get_balance(a) ili
+    lambda: contract.functions.paid().
+    """
+    enabled = os.getenv("RPC_BATCHING", "1") == "1"
+
+    @staticmethod
+    def execute(**reads):
+        names = list(reads)
+        if ReadBatch.enabled and len(names) > 1:
+            with OrderContract.w3.batch_requests() as batch:
+                for name in names:
+                    batch.add(reads[name]())
+                results = batch.execute()
+            return dict(zip(names, results))
+
+        results = {}
+        for name in names:
+            result = reads[name]()
+            results[name] = result.call() if hasattr(result, "call") else result
+        return results
+
+
+class ReceiptTracker:
+    """
+    Jedna petlja po procesu prati nove blokove (eth_blockNumber) i razrešava
+    future-e svih transakcija iz bloka koje čekaju potvrdu, umesto posebnog
+    wait_for_transaction_receipt poll-a za svaki zahtev. Hash se prijavljuje
+    pre slanja, pa petlja ne može da propusti blok sa transakcijom.
+    """
+    interval = float(os.getenv("RECEIPT_POLL_INTERVAL", "0.2"))
+    timeout = float(os.getenv("RECEIPT_TIMEOUT", "120"))
+    lock = threading.Lock()
+    pending = {}
+    running = False
+    last_block = None
+
+    @staticmethod
+    def track(tx_hash):
+        key = ReceiptTracker._key(tx_hash)
+        with ReceiptTracker.lock:
+            future = ReceiptTracker.pending.get(key)
+            if future is None:
+                future = ReceiptTracker.pending[key] = Future()
+            if ReceiptTracker.running:
+                return future
+
+        # blokovi pre ovog ne mogu sadržati transakciju koja tek treba da se pošalje;
+        # RPC poziv ide van lock-a da ne bi blokirao petlju i ostale zahteve
+        block_number = OrderContract.w3.eth.block_number
+        with ReceiptTracker.lock:
+            if not ReceiptTracker.running:
+                ReceiptTracker.last_block = block_number
+                ReceiptTracker.running = True
+                threading.Thread(target=ReceiptTracker._loop, name="receipt-tracker", daemon=True).start()
+        return future
+
+    @staticmethod
+    def untrack(tx_hash):
+        with ReceiptTracker.lock:
+            ReceiptTracker.pending.pop(ReceiptTracker._key(tx_hash), None)
+
+    @staticmethod
+    def pending_count():
+        with ReceiptTracker.lock:
+            return len(ReceiptTracker.pending)
+
+    @staticmethod
+    def wait(tx_hash, timeout=None):
+        key = ReceiptTracker._key(tx_hash)
+        with ReceiptTracker.lock:
+            future = ReceiptTracker.pending.get(key)
+        if future is None:
+            # transakcija nije prijavljena pre slanja i možda je već potvrđena
+            receipt = ReceiptTracker._receipt(key)
+            if receipt is not None:
+                return receipt
+            future = ReceiptTracker.track(key)
+            receipt = ReceiptTracker._receipt(key)
+            if receipt is not None:
+                ReceiptTracker.untrack(key)
+                return receipt
+
+        timeout = ReceiptTracker.timeout if timeout is None else timeout
+        remaining = Deadline.remaining()
+        limited = remaining is not None and remaining < timeout
+        if limited:
+            timeout = max(remaining, 0)
+        try:
+            return future.result(timeout)
+        except FutureTimeoutError:
+            ReceiptTracker.untrack(key)
+            if limited:
+                raise ChainDeadlineExceeded()
+            # Sve transakcije procesa šalje owner nalog; transakcija koja ne stiže u lanac
+            # može čekati iza izgubljenog nonce-a, pa se brojač ponovo čita sa čvora
+            NonceManager.reset(OrderContract.owner_address)
+            raise TimeExhausted(f"Transaction {key} is not in the chain after {timeout} seconds")
+
+    @staticmethod
+    def _key(tx_hash):
+        if isinstance(tx_hash, str):
+            return Web3.to_hex(hexstr=tx_hash).lower()
+        return Web3.to_hex(tx_hash).lower()
+
+    @staticmethod
+    def _receipt(tx_hash):
+        try:
+            return OrderContract.w3.eth.get_transaction_receipt(tx_hash)
+        except TransactionNotFound:
+            return None
+
+    @staticmethod
+    def _loop():
+        while True:
+            with ReceiptTracker.lock:
+                if not ReceiptTracker.pending:
+                    ReceiptTracker.running = False
+                    return
+            try:
+                latest = OrderContract.w3.eth.block_number
+                while ReceiptTracker.last_block < latest:
+                    ReceiptTracker._scan(ReceiptTracker.last_block + 1)
+                    ReceiptTracker.last_block += 1
+            except ChainUnavailable:
+                # prekidač je otvoren, čeka se sledeći probni poziv
+                pass
+            except Exception as e:
+                print(f"Receipt tracker error: {e}")
+            time.sleep(ReceiptTracker.interval)
+
+    @staticmethod
+    def _scan(block_number):
+        block = OrderContract.w3.eth.get_block(block_number)
+        with ReceiptTracker.lock:
+            found = [
+                key for key in (ReceiptTracker._key(tx) for tx in block.transactions)
+                if key in ReceiptTracker.pending
+            ]
+        if not found:
+            return
+
+        receipts = ReadBatch.execute(
+            **{key: (lambda key=key: OrderContract.w3.eth.get_transaction_receipt(key)) for key in found}
+        )
+        with ReceiptTracker.lock:
+            for key in found:
+                future = ReceiptTracker.pending.pop(key, None)
+                if future is not None:
+                    future.set_result(receipts[key])
 
 
 class OrderContract:
-    w3 = Web3(Web3.HTTPProvider("http://ganache:8545"))  # Promeni prema svom provider-u
+    w3 = LazyWeb3()
+
+    # PER_ORDER: poseban ugovor po narudžbini, CLONE: EIP-1167 proxy po narudžbini,
+    # REGISTRY: jedan OrderBook ugovor
+    mode = os.getenv("CONTRACT_MODE", "PER_ORDER").upper()
 
-    with open("Contract.json", "r") as f:
-        data = json.load(f)
-        abi = data["abi"]
-        bytecode = data["bytecode"]
+    abi = LazyArtifact("Contract", "abi")
+    bytecode = LazyArtifact("Contract", "bytecode")
+
+    @staticmethod
+    def node_ready():
+        try:
+            OrderContract.w3.eth.block_number
+            return True
+        except Exception:
+            return False
+
+    @staticmethod
+    def cache_stats():
+        return {
+            "contracts": OrderContract.contracts.stats(),
+            "checksums": OrderContract.checksums.stats(),
+            "balances": OrderContract.balances.stats()
+        }
+
+    @staticmethod
+    def for_mode(mode):
+        if mode == "REGISTRY":
+            return OrderBook
+        if mode == "CLONE":
+            return OrderClone
+        return OrderContract
+
+    # Poslednji nalog u ganache-u + njegov privatni ključ; adresa se izvodi iz
+    # ključa lokalno, bez eth_accounts poziva pri svakoj transakciji
+    owner_private_key = "0xb64be88dd6b89facf295f4fd0dda082efcbe95a2bb4478f5ee582b7efe88cf60"
+    owner_address = Account.from_key(owner_private_key).address
+    chain_id = None
+
+    # Keš contract objekata po adresi i keš provera adresa (checksum, stanje > 0)
+    contracts = LRUCache(int(os.getenv("CONTRACT_CACHE_SIZE", "1024")))
+    checksums = TTLCache(int(os.getenv("ADDRESS_CACHE_SIZE", "10000")), float(os.getenv("ADDRESS_CACHE_TTL", "30")))
+    balances = TTLCache(int(os.getenv("ADDRESS_CACHE_SIZE", "10000")), float(os.getenv("ADDRESS_CACHE_TTL", "30")))
 
     @staticmethod
     def get_owner_account_and_key():
-        accounts = OrderContract.w3.eth.accounts
-        if not accounts:
-            raise ValueError("Nema dostupnih računa u provider-u")
-        # Ovde poslednji nalog + njegov privatni ključ
-        return accounts[-1], "0xb64be88dd6b89facf295f4fd0dda082efcbe95a2bb4478f5ee582b7efe88cf60"
+        return OrderContract.owner_address, OrderContract.owner_private_key
+
+    @staticmethod
+    def get_chain_id():
+        if OrderContract.chain_id is None:
+            OrderContract.chain_id = OrderContract.w3.eth.chain_id
+        return OrderContract.chain_id
 
 
     @staticmethod
+    def send_owner_transaction(build, on_signed=None):
+        # build(owner_address, nonce) pravi transakciju; ako čvor odbije nonce,
+        # brojač se resinhronizuje i transakcija se šalje još jednom.
+        # on_signed(tx_hash) se poziva pre slanja, npr. da se hash sačuva pre nego
+        # što transakcija može da stigne u lanac
+        owner_address, owner_private_key = OrderContract.get_owner_account_and_key()
+        for attempt in range(2):
+            nonce = NonceManager.allocate(owner_address)
+            signed_tx = None
+            sending = False
+            try:
+                tx = build(owner_address, nonce)
+                signed_tx = OrderContract.w3.eth.account.sign_transaction(tx, owner_private_key)
+                ReceiptTracker.track(signed_tx.hash)
+                if on_signed is not None:
+                    on_signed(Web3.to_hex(signed_tx.hash))
+                sending = True
+                return OrderContract.w3.eth.send_raw_transaction(signed_tx.raw_transaction)
+            except Exception as e:
+                if signed_tx is not None:
+                    ReceiptTracker.untrack(signed_tx.hash)
+                if NonceManager.is_nonce_error(e):
+                    NonceManager.reset(owner_address)
+                    if attempt == 0:
+                        continue
+                elif sending:
+                    # ne zna se da li je čvor primio transakciju; ako nije, nonce bi ostao
+                    # rupa u kojoj čekaju sve kasnije transakcije, pa se brojač resinhronizuje
+                    NonceManager.reset(owner_address)
+                else:
+                    # transakcija nije stigla do čvora, nonce nije potrošen
+                    NonceManager.release(owner_address, nonce)
+                raise
+
+    @staticmethod
+    def await_sent(tx_hash, message):
+        # Posle slanja transakcija je na čvoru: ako potvrda ne stigne do isteka roka,
+        # vraća se "submitted" sa hash-om umesto greške, a status narudžbine u bazi
+        # usklađuje indekser kada vidi događaj ugovora
+        try:
+            ReceiptTracker.wait(tx_hash)
+        except ChainDeadlineExceeded:
+            return {"success": True, "submitted": True, "message": Web3.to_hex(tx_hash)}
+        return {"success": True, "message": message}
+
+    @staticmethod
+    def courier_indexed(state, courier_address):
+        # Ponovljen zahtev posle "submitted" odgovora: isti kurir je već dodeljen na lancu
+        return state is not None and state.courier is not None and \
+            state.courier.lower() == courier_address.lower()
+
+    @staticmethod
+    def deploy_artifact(artifact, gas):
+        # Jednokratni deploy pomoćnih ugovora (OrderBook, OrderFactory), vraća potvrdu
+        contract = OrderContract.w3.eth.contract(abi=artifact["abi"], bytecode=artifact["bytecode"])
+        tx_hash = OrderContract.send_owner_transaction(
+            lambda owner_address, nonce: contract.constructor().build_transaction({
+                'from': owner_address,
+                'nonce': nonce,
+                'gas': gas,
+                'gasPrice': OrderContract.w3.to_wei('1', 'gwei'),
+                'chainId': OrderContract.get_chain_id()
+            })
+        )
+        receipt = ReceiptTracker.wait(tx_hash)
+        if receipt.status != 1:
+            raise RuntimeError("Contract deployment failed.")
+        return receipt
+
+    @staticmethod
+    def contract_at(address, name="Contract"):
+        abi = OrderContract.abi if name == "Contract" else load_artifact(name)["abi"]
+        return OrderContract.contracts.get_or_create(
+            (name, address),
+            lambda: OrderContract.w3.eth.contract(address=address, abi=abi)
+        )
+
+    @staticmethod
+    def address_format_valid(address) -> bool:
+        # web3 prihvata samo checksum adrese, ostale bi pale pri slanju zahteva
+        if not isinstance(address, str):
+            return False
+        return OrderContract.checksums.get_or_create(
+            address,
+            lambda: OrderContract.w3.is_address(address) and OrderContract.w3.is_checksum_address(address)
+        )
+
+    @staticmethod
+    def add_balance_read(address, reads):
+        # Stanje naloga se dodaje u batch samo ako provera nije u kešu
+        funded = OrderContract.balances.get(address)
+        if funded is None:
+            reads["balance"] = lambda: OrderContract.w3.eth.get_balance(address)
+        return funded
+
+    @staticmethod
+    def is_funded(address, funded, values):
+        if funded is None:
+            funded = values["balance"] > 0
+            OrderContract.balances.put(address, funded)
+        return funded
+
+    @staticmethod
+    @with_deadline
     def address_valid(address) -> bool:
-        if not OrderContract.w3.is_address(address):
+        if not OrderContract.address_format_valid(address):
             return False
 
         try:
-            balance = OrderContract.w3.eth.get_balance(address)
-            if (balance > 0):
-                return True
-            else:
-                return False
+            reads = {}
+            funded = OrderContract.add_balance_read(address, reads)
+            return OrderContract.is_funded(address, funded, ReadBatch.execute(**reads))
+        except ChainUnavailable:
+            raise
         except Exception:
             return False
 
     @staticmethod
+    @with_deadline
     def deploy(customer_address, price):
         if not OrderContract.address_valid(customer_address):
             return {"success": False, "message": "Invalid address."}
-        owner_address, owner_private_key = OrderContract.get_owner_account_and_key()
-        print(owner_address)
+        sent = OrderContract.send_deploy(customer_address, price)
+        if not sent["success"]:
+            return sent
+        return OrderContract.deploy_result(sent["message"])
+
+    @staticmethod
+    def send_deploy(customer_address, price, order_id=None, on_signed=None):
+        # Šalje transakciju za kreiranje ugovora bez čekanja potvrde,
+        # adresa kupca mora biti prethodno proverena
         contract = OrderContract.w3.eth.contract(abi=OrderContract.abi, bytecode=OrderContract.bytecode)
         price_wei = price * 100
-        tx = contract.constructor(customer_address, int(price_wei)).build_transaction({
-            'from': owner_address,
-            'nonce': OrderContract.w3.eth.get_transaction_count(owner_address),
-            'gas': 1000000,
-            'gasPrice': OrderContract.w3.to_wei('1', 'gwei')
-        })
+        tx_hash = OrderContract.send_owner_transaction(
+            lambda owner_address, nonce: contract.constructor(customer_address, int(price_wei)).build_transaction({
+                'from': owner_address,
+                'nonce': nonce,
+                'gas': 1000000,
+                'gasPrice': OrderContract.w3.to_wei('1', 'gwei'),
+                'chainId': OrderContract.get_chain_id()
+            }),
+            on_signed
+        )
+        return {"success": True, "message": Web3.to_hex(tx_hash)}
 
-        signed_tx = OrderContract.w3.eth.account.sign_transaction(tx, owner_private_key)
-        tx_hash = OrderContract.w3.eth.send_raw_transaction(signed_tx.raw_transaction)
-        receipt = OrderContract.w3.eth.wait_for_transaction_receipt(tx_hash)
+    @staticmethod
+    def deploy_result(tx_hash):
+        receipt = ReceiptTracker.wait(tx_hash)
+        if receipt.status != 1 or not receipt.contractAddress:
+            return {"success": False, "message": "Contract deployment failed."}
         return {"success": True, "message": receipt.contractAddress}
 
     @staticmethod
-    def assign_courier(contract_address, courier_address):
-        if not OrderContract.address_valid(courier_address):
+    @with_deadline
+    def assign_courier(contract_address, courier_address, order_id=None):
+        if not OrderContract.address_format_valid(courier_address):
             return {"success": False, "message": "Invalid address."}
-        owner_address, owner_private_key = OrderContract.get_owner_account_and_key()
-        contract = OrderContract.w3.eth.contract(address=contract_address, abi=OrderContract.abi)
-        paid = contract.functions.paid().call()
-        if not paid:
+        contract = OrderContract.contract_at(contract_address)
+
+        # Indeksirano plaćanje je konačno, čvor se pita samo ako ga indekser još nije video
+        state = OrderChainState.indexed(order_id)
+        if OrderContract.courier_indexed(state, courier_address):
+            return {"success": True, "message": "Courier assigned successfully."}
+        reads = {}
+        funded = OrderContract.add_balance_read(courier_address, reads)
+        if state is None or not state.paid:
+            reads["paid"] = lambda: contract.functions.paid()
+        values = ReadBatch.execute(**reads)
+
+        if not OrderContract.is_funded(courier_address, funded, values):
+            return {"success": False, "message": "Invalid address."}
+        if not values.get("paid", True):
             return {"success": False, "message": "Transfer not complete."}
-        tx = contract.functions.assignCourier(courier_address).build_transaction({
-            'from': owner_address,
-            'nonce': OrderContract.w3.eth.get_transaction_count(owner_address),
-            'gas': 1000000,
-            'gasPrice': OrderContract.w3.to_wei('1', 'gwei')
-        })
-        signed_tx = OrderContract.w3.eth.account.sign_transaction(tx, owner_private_key)
-        tx_hash = OrderContract.w3.eth.send_raw_transaction(signed_tx.raw_transaction)
-        OrderContract.w3.eth.wait_for_transaction_receipt(tx_hash)
-        return {"success": True, "message": "Courier assigned successfully."}
+        tx_hash = OrderContract.send_owner_transaction(
+            lambda owner_address, nonce: contract.functions.assignCourier(courier_address).build_transaction({
+                'from': owner_address,
+                'nonce': nonce,
+                'gas': 1000000,
+                'gasPrice': OrderContract.w3.to_wei('1', 'gwei'),
+                'chainId': OrderContract.get_chain_id()
+            })
+        )
+        return OrderContract.await_sent(tx_hash, "Courier assigned successfully.")
 
     @staticmethod
-    def confirm_delivery(contract_address):
-        contract = OrderContract.w3.eth.contract(address=contract_address, abi=OrderContract.abi)
-        owner_address, owner_private_key = OrderContract.get_owner_account_and_key()
-        courier_address = contract.functions.courier().call()
+    @with_deadline
+    def confirm_delivery(contract_address, order_id=None):
+        contract = OrderContract.contract_at(contract_address)
+        state = OrderChainState.indexed(order_id)
+        if state is not None and state.delivered:
+            return {"success": True, "message": "Delivery confirmed."}
+        if state is not None and state.courier:
+            courier_address = state.courier
+        else:
+            courier_address = contract.functions.courier().call()
         if courier_address == '0x0000000000000000000000000000000000000000':
             return {"success": False, "message": "Delivery not complete."}
-        tx = contract.functions.confirmDelivery().build_transaction({
-            'from': owner_address,
-            'gas': 150000,
-            'nonce': OrderContract.w3.eth.get_transaction_count(owner_address),
-            'gasPrice': OrderContract.w3.to_wei(1, 'gwei')
-        })
-        signed_tx = OrderContract.w3.eth.account.sign_transaction(tx, owner_private_key)
-        tx_hash = OrderContract.w3.eth.send_raw_transaction(signed_tx.raw_transaction)
-        OrderContract.w3.eth.wait_for_transaction_receipt(tx_hash)
-        return {"success": True, "message": f"Delivery confirmed. Tx hash: {tx_hash.hex()}"}
+        tx_hash = OrderContract.send_owner_transaction(
+            lambda owner_address, nonce: contract.functions.confirmDelivery().build_transaction({
+                'from': owner_address,
+                'gas': 150000,
+                'nonce': nonce,
+                'gasPrice': OrderContract.w3.to_wei(1, 'gwei'),
+                'chainId': OrderContract.get_chain_id()
+            })
+        )
+        return OrderContract.await_sent(tx_hash, f"Delivery confirmed. Tx hash: {tx_hash.hex()}")
 
     @staticmethod
-    def generate_invoice(contract_address, customer_address):
-        if not OrderContract.address_valid(customer_address):
+    @with_deadline
+    def generate_invoice(contract_address, customer_address, order_id=None):
+        if not OrderContract.address_format_valid(customer_address):
             return {"success": False, "message": "Invalid address."}
 
-        contract = OrderContract.w3.eth.contract(address=contract_address, abi=OrderContract.abi)
+        contract = OrderContract.contract_at(contract_address)
+
+        # Stanje naloga, plaćenost, cena i nonce kupca se čitaju jednim batch-om
+        state = OrderChainState.indexed(order_id)
+        reads = {
+            "price": lambda: contract.functions.price(),
+            "nonce": lambda: OrderContract.w3.eth.get_transaction_count(customer_address)
+        }
+        funded = OrderContract.add_balance_read(customer_address, reads)
+        if state is None or not state.paid:
+            reads["paid"] = lambda: contract.functions.paid()
+        values = ReadBatch.execute(**reads)
+
+        if not OrderContract.is_funded(customer_address, funded, values):
+            return {"success": False, "message": "Invalid address."}
 
         # Provera da li je već plaćeno
-        paid = contract.functions.paid().call()
-        if paid:
+        if values.get("paid", True):
             return {"success": False, "message": "Transfer already complete."}
 
-        # Uzima cenu direktno iz contract-a
-        price_wei = contract.functions.price().call()
-
         # Generisanje transakcije (invoice) bez izvršenja
         tx = contract.functions.pay().build_transaction({
             'from': customer_address,
-            'value': price_wei,
+            'value': values["price"],
             'gas': 200000,
-            'nonce': OrderContract.w3.eth.get_transaction_count(customer_address),
-            'gasPrice': OrderContract.w3.to_wei(1, 'gwei')
+            'nonce': values["nonce"],
+            'gasPrice': OrderContract.w3.to_wei(1, 'gwei'),
+            'chainId': OrderContract.get_chain_id()
         })
 
         return {"success": True, "message": tx}
 
 
+class OrderBook(OrderContract):
+    """
+    Registry režim: jedan dugovečni OrderBook ugovor čuva stavku po narudžbini
+    (customer, price, paid, courier, delivered) pod id-jem narudžbine, pa se
+    umesto deploy-a po narudžbini šalje samo createOrder transakcija.
+    """
+    address = None
+    address_lock = threading.Lock()
+
+    @staticmethod
+    def contract():
+        return OrderContract.contract_at(OrderBook.get_address(), "OrderBook")
+
+    @staticmethod
+    def get_address():
+        with OrderBook.address_lock:
+            if OrderBook.address is None:
+                configured = os.getenv("ORDER_BOOK_ADDRESS")
+                if configured:
+                    OrderBook.address = Web3.to_checksum_address(configured)
+                else:
+                    OrderBook.address = DeployedContract.get_or_deploy(
+                        "OrderBook",
+                        lambda: OrderContract.deploy_artifact(load_artifact("OrderBook"), 2000000).contractAddress
+                    )
+            return OrderBook.address
+
+    @staticmethod
+    def send_deploy(customer_address, price, order_id=None, on_signed=None):
+        book = OrderBook.contract()
+        price_wei = price * 100
+        tx_hash = OrderContract.send_owner_transaction(
+            lambda owner_address, nonce: book.functions.createOrder(order_id, customer_address, int(price_wei)).build_transaction({
+                'from': owner_address,
+                'nonce': nonce,
+                'gas': 200000,
+                'gasPrice': OrderContract.w3.to_wei('1', 'gwei'),
+                'chainId': OrderContract.get_chain_id()
+            }),
+            on_signed
+        )
+        return {"success": True, "message": Web3.to_hex(tx_hash)}
+
+    @staticmethod
+    def deploy_result(tx_hash):
+        receipt = ReceiptTracker.wait(tx_hash)
+        if receipt.status != 1:
+            return {"success": False, "message": "Contract deployment failed."}
+        return {"success": True, "message": OrderBook.get_address()}
+
+    @staticmethod
+    @with_deadline
+    def deploy(customer_address, price, order_id=None):
+        if not OrderContract.address_valid(customer_address):
+            return {"success": False, "message": "Invalid address."}
+        sent = OrderBook.send_deploy(customer_address, price, order_id)
+        return OrderBook.deploy_result(sent["message"])
+
+    @staticmethod
+    def entry(order_id):
+        return OrderBook.parse_entry(OrderBook.contract().functions.orders(order_id).call())
+
+    @staticmethod
+    def parse_entry(values):
+        customer, price, courier, paid, delivered, exists = values
+        return {"customer": customer, "price": price, "courier": courier,
+                "paid": paid, "delivered": delivered, "exists": exists}
+
+    @staticmethod
+    @with_deadline
+    def assign_courier(contract_address, courier_address, order_id=None):
+        if not OrderContract.address_format_valid(courier_address):
+            return {"success": False, "message": "Invalid address."}
+        book = OrderBook.contract()
+
+        state = OrderChainState.indexed(order_id)
+        if OrderContract.courier_indexed(state, courier_address):
+            return {"success": True, "message": "Courier assigned successfully."}
+        reads = {}
+        funded = OrderContract.add_balance_read(courier_address, reads)
+        if state is None or not state.paid:
+            reads["entry"] = lambda: book.functions.orders(order_id)
+        values = ReadBatch.execute(**reads)
+
+        if not OrderContract.is_funded(courier_address, funded, values):
+            return {"success": False, "message": "Invalid address."}
+        if "entry" in values and not OrderBook.parse_entry(values["entry"])["paid"]:
+            return {"success": False, "message": "Transfer not complete."}
+        tx_hash = OrderContract.send_owner_transaction(
+            lambda owner_address, nonce: book.functions.assignCourier(order_id, courier_address).build_transaction({
+                'from': owner_address,
+                'nonce': nonce,
+                'gas': 200000,
+                'gasPrice': OrderContract.w3.to_wei('1', 'gwei'),
+                'chainId': OrderContract.get_chain_id()
+            })
+        )
+        return OrderContract.await_sent(tx_hash, "Courier assigned successfully.")
+
+    @staticmethod
+    @with_deadline
+    def confirm_delivery(contract_address, order_id=None):
+        state = OrderChainState.indexed(order_id)
+        if state is not None and state.delivered:
+            return {"success": True, "message": "Delivery confirmed."}
+        if not (state is not None and state.courier) and \
+                OrderBook.entry(order_id)["courier"] == '0x0000000000000000000000000000000000000000':
+            return {"success": False, "message": "Delivery not complete."}
+        book = OrderBook.contract()
+        tx_hash = OrderContract.send_owner_transaction(
+            lambda owner_address, nonce: book.functions.confirmDelivery(order_id).build_transaction({
+                'from': owner_address,
+                'gas': 150000,
+                'nonce': nonce,
+                'gasPrice': OrderContract.w3.to_wei(1, 'gwei'),
+                'chainId': OrderContract.get_chain_id()
+            })
+        )
+        return OrderContract.await_sent(tx_hash, f"Delivery confirmed. Tx hash: {tx_hash.hex()}")
+
+    @staticmethod
+    @with_deadline
+    def generate_invoice(contract_address, customer_address, order_id=None):
+        if not OrderContract.address_format_valid(customer_address):
+            return {"success": False, "message": "Invalid address."}
+        book = OrderBook.contract()
+
+        # Stanje i cena se čitaju iz stavke narudžbine, zajedno sa nalogom kupca
+        reads = {
+            "entry": lambda: book.functions.orders(order_id),
+            "nonce": lambda: OrderContract.w3.eth.get_transaction_count(customer_address)
+        }
+        funded = OrderContract.add_balance_read(customer_address, reads)
+        values = ReadBatch.execute(**reads)
+        if not OrderContract.is_funded(customer_address, funded, values):
+            return {"success": False, "message": "Invalid address."}
+
+        entry = OrderBook.parse_entry(values["entry"])
+        if entry["paid"]:
+            return {"success": False, "message": "Transfer already complete."}
+
+        tx = book.functions.pay(order_id).build_transaction({
+            'from': customer_address,
+            'value': entry["price"],
+            'gas': 200000,
+            'nonce': values["nonce"],
+            'gasPrice': OrderContract.w3.to_wei(1, 'gwei'),
+            'chainId': OrderContract.get_chain_id()
+        })
+
+        return {"success": True, "message": tx}
+
+
+class OrderClone(OrderContract):
+    """
+    Clone režim: OrderFactory jednom deploy-uje implementaciju, a svaka
+    narudžbina je EIP-1167 minimalni proxy inicijalizovan u istoj transakciji.
+    Proxy ima isti ABI kao OrderContract, pa se ostale metode nasleđuju.
+    """
+    address = None
+    address_lock = threading.Lock()
+
+    @staticmethod
+    def factory():
+        return OrderContract.contract_at(OrderClone.get_address(), "OrderFactory")
+
+    @staticmethod
+    def get_address():
+        with OrderClone.address_lock:
+            if OrderClone.address is None:
+                configured = os.getenv("ORDER_FACTORY_ADDRESS")
+                if configured:
+                    OrderClone.address = Web3.to_checksum_address(configured)
+                else:
+                    OrderClone.address = DeployedContract.get_or_deploy(
+                        "OrderFactory",
+                        lambda: OrderContract.deploy_artifact(load_artifact("OrderFactory"), 3000000).contractAddress
+                    )
+            return OrderClone.address
+
+    @staticmethod
+    @with_deadline
+    def deploy(customer_address, price, order_id=None):
+        if not OrderContract.address_valid(customer_address):
+            return {"success": False, "message": "Invalid address."}
+        sent = OrderClone.send_deploy(customer_address, price, order_id)
+        return OrderClone.deploy_result(sent["message"])
+
+    @staticmethod
+    def send_deploy(customer_address, price, order_id=None, on_signed=None):
+        factory = OrderClone.factory()
+        price_wei = price * 100
+        tx_hash = OrderContract.send_owner_transaction(
+            lambda owner_address, nonce: factory.functions.createOrder(customer_address, int(price_wei)).build_transaction({
+                'from': owner_address,
+                'nonce': nonce,
+                'gas': 300000,
+                'gasPrice': OrderContract.w3.to_wei('1', 'gwei'),
+                'chainId': OrderContract.get_chain_id()
+            }),
+            on_signed
+        )
+        return {"success": True, "message": Web3.to_hex(tx_hash)}
+
+    @staticmethod
+    def deploy_result(tx_hash):
+        receipt = ReceiptTracker.wait(tx_hash)
+        if receipt.status != 1:
+            return {"success": False, "message": "Contract deployment failed."}
+        # Adresa klona se čita iz OrderCreated događaja fabrike
+        events = OrderClone.factory().events.OrderCreated().process_receipt(receipt)
+        if not events:
+            return {"success": False, "message": "Contract deployment failed."}
+        return {"success": True, "message": events[0]["args"]["order"]}
+
+
 #
 #
 def create_and_initialize_account ( provider_url ):
@@ -166,5 +1069,3 @@ def create_and_initialize_account ( provider_url ):
     } )
     receipt = web3.eth.wait_for_transaction_receipt(result)
     return ( private_key, address )
-
-
@@ -0,0 +1,155 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUCache:
+    """Ograničen keš sa LRU izbacivanjem i brojačima pogodaka/promašaja, bezbedan za niti."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_create(self, key, factory):
+        value = self.get(key)
+        if value is None:
+            value = factory()
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        with self.lock:
+            return {
+                "size": len(self.entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions
+            }
+
+
+class TTLCache(LRUCache):
+    """LRUCache čije stavke ističu ttl sekundi posle upisa."""
+
+    def __init__(self, maxsize, ttl):
+        super().__init__(maxsize)
+        self.ttl = ttl
+        self.expired = 0
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                value, expires = entry
+                if expires > time.monotonic():
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self.entries[key]
+                self.expired += 1
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        super().put(key, (value, time.monotonic() + self.ttl))
+
+    def stats(self):
+        stats = super().stats()
+        with self.lock:
+            stats["ttl"] = self.ttl
+            stats["expired"] = self.expired
+        return stats
+
+
+class StaleWhileRevalidate:
+    """
+    Jedna vrednost koja važi ttl sekundi. Posle toga se, do max_stale sekundi,
+    i dalje odmah vraća stara vrednost dok je jedna pozadinska nit ponovo
+    učitava; bez vrednosti ili sa prestarom vrednošću učitava se sinhrono.
+    """
+
+    def __init__(self, ttl, max_stale):
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self.lock = threading.Lock()
+        self.value = None
+        self.loaded_at = None
+        self.refreshing = False
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.refresh_errors = 0
+
+    def get(self, loader):
+        with self.lock:
+            age = None if self.loaded_at is None else time.monotonic() - self.loaded_at
+            if age is not None and age < self.ttl:
+                self.hits += 1
+                return self.value
+            if age is not None and age < self.max_stale:
+                self.stale_hits += 1
+                if not self.refreshing:
+                    self.refreshing = True
+                    threading.Thread(target=self._refresh, args=(loader,), daemon=True).start()
+                return self.value
+            self.misses += 1
+        value = loader()
+        self._store(value)
+        return value
+
+    def _store(self, value):
+        with self.lock:
+            self.value = value
+            self.loaded_at = time.monotonic()
+
+    def _refresh(self, loader):
+        try:
+            self._store(loader())
+            with self.lock:
+                self.refreshes += 1
+        except Exception as e:
+            print(f"Background refresh failed: {e}")
+            with self.lock:
+                self.refresh_errors += 1
+        finally:
+            with self.lock:
+                self.refreshing = False
+
+    def stats(self):
+        with self.lock:
+            return {
+                "ttl": self.ttl,
+                "max_stale": self.max_stale,
+                "age": None if self.loaded_at is None else round(time.monotonic() - self.loaded_at, 3),
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "refreshes": self.refreshes,
+                "refresh_errors": self.refresh_errors
+            }
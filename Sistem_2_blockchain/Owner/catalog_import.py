@@ -0,0 +1,315 @@
+import csv
+import hashlib
+import io
+import os
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+from sqlalchemy import select, insert, delete, tuple_
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.exc import IntegrityError
+
+from ORM import db, Product, Category, ProductCategory, CategorySales, CatalogVersion
+
+
+class CatalogImporter:
+    """
+    Uvoz CSV kataloga (kategorije|..., ime, cena) u jednom prolazu kroz fajl.
+    Proizvodi i veze sa kategorijama se upisuju višerednim INSERT-ima po
+    chunk_size redova, sve u jednoj transakciji. Redosled grešaka je isti kao
+    ranije: broj kolona na bilo kojoj liniji, pa cena, pa duplikat proizvoda.
+
+    U sync režimu postojeći proizvodi nisu greška: heš cene i skupa kategorija
+    se poredi sa sačuvanim, a upisuju se samo novi i izmenjeni redovi
+    (INSERT ... ON DUPLICATE KEY UPDATE) i veze kojima se promenio skup.
+    """
+    chunk_size = int(os.getenv("CATALOG_IMPORT_CHUNK", "1000"))
+
+    def __init__(self, sync=False, progress=None):
+        # ime kategorije malim slovima -> id (kolacija baze ne razlikuje velika i mala slova)
+        self.category_ids = {}
+        # id -> ime kategorije kako je upisano u bazi
+        self.category_names = {}
+        self.seen = set()
+        # progress(rows_validated, rows_written) se poziva posle svakog chunk-a
+        self.progress = progress
+        self.sync = sync
+        self.catalog_version = None
+        self.added = 0
+        self.changed = 0
+        self.unchanged = 0
+        self.rows_validated = 0
+        self.rows_written = 0
+        self.error_line = None
+
+    @staticmethod
+    def parse_price(price_str):
+        try:
+            price = Decimal(price_str)
+            if price > 0:
+                return price
+        except (InvalidOperation, ValueError):
+            pass
+        return None
+
+    @staticmethod
+    def parse_row(row):
+        cat_str, name, price_str = row
+        categories = [c.strip() for c in (cat_str.split("|") if cat_str else []) if c.strip()]
+        return categories, name.strip(), CatalogImporter.parse_price(price_str)
+
+    @staticmethod
+    def row_hash(price, category_names):
+        # cena se zaokružuje kao u koloni DECIMAL(10,2)
+        price = Decimal(price).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+        content = "\x1f".join([str(price), *sorted(set(category_names))])
+        return hashlib.sha256(content.encode()).hexdigest()
+
+    def summary(self):
+        return {"added": self.added, "changed": self.changed, "unchanged": self.unchanged}
+
+    def run(self, stream):
+        # Vraća poruku greške ili None; pri grešci se ništa ne upisuje
+        column_error = None
+        price_error = None
+        price_line = None
+        duplicate = None
+        chunk = []
+        try:
+            reader = csv.reader(io.TextIOWrapper(stream, encoding="utf-8", newline=""), delimiter=",")
+            for idx, row in enumerate(reader):
+                self.rows_validated = idx + 1
+                if self.progress is not None and self.rows_validated % CatalogImporter.chunk_size == 0:
+                    self.progress(self.rows_validated, self.rows_written)
+                if len(row) != 3:
+                    column_error = f"Incorrect number of values on line {idx}."
+                    self.error_line = idx
+                    break
+                # posle greške u ceni proverava se još samo broj kolona
+                if price_error is not None:
+                    continue
+                categories, name, price = CatalogImporter.parse_row(row)
+                if price is None:
+                    price_error = f"Incorrect price on line {idx}."
+                    price_line = idx
+                    continue
+                # posle duplikata se ne upisuje, ali se i dalje proveravaju cene
+                if duplicate is not None:
+                    continue
+                chunk.append((idx, categories, name, price))
+                if len(chunk) >= CatalogImporter.chunk_size:
+                    duplicate = self.sync_write(chunk) if self.sync else self.write(chunk)
+                    chunk = []
+            if column_error is None and price_error is None and duplicate is None and chunk:
+                duplicate = self.sync_write(chunk) if self.sync else self.write(chunk)
+        except UnicodeDecodeError:
+            # kao i ranije, fajl koji nije UTF-8 se tretira kao prazan
+            db.session.rollback()
+            return None
+
+        error = column_error
+        if error is None and price_error is not None:
+            error = price_error
+            self.error_line = price_line
+        if error is None and duplicate is not None:
+            self.error_line, name = duplicate
+            error = f"Product {name} already exists."
+        if error is not None:
+            db.session.rollback()
+            return error
+
+        if self.sync and self.catalog_version is None:
+            # ništa nije izmenjeno, verzija kataloga (i keševi pretrage) ostaje ista
+            db.session.rollback()
+            return None
+
+        # Keševi pretrage u Customer servisu se poništavaju novom verzijom kataloga
+        if self.catalog_version is None:
+            CatalogVersion.bump()
+        db.session.commit()
+        return None
+
+    def version(self):
+        # Nova verzija kataloga se upisuje u dodate i izmenjene proizvode, pa se povećava pri prvoj izmeni
+        if self.catalog_version is None:
+            self.catalog_version = CatalogVersion.bump()
+        return self.catalog_version
+
+    def write(self, chunk):
+        # Upisuje chunk i vraća (liniju, ime) prvog proizvoda koji već postoji, ili None
+        names = [name for _, _, name, _ in chunk]
+        existing = {
+            name.lower() for name in db.session.execute(
+                select(Product.name).where(Product.name.in_(names))
+            ).scalars()
+        }
+        for idx, _, name, _ in chunk:
+            key = name.lower()
+            if key in existing or key in self.seen:
+                return idx, name
+            self.seen.add(key)
+
+        self.resolve_categories(categories for _, categories, _, _ in chunk)
+        # verzija kataloga u svakom redu je oznaka za dopunu indeksa pretrage
+        rows = [
+            {"name": name, "price": price, "category_names": self.canonical(categories), "catalog_version": self.version()}
+            for _, categories, name, price in chunk
+        ]
+        try:
+            with db.session.begin_nested():
+                db.session.execute(insert(Product), rows)
+        except IntegrityError:
+            # kolacija baze smatra jednakim i imena koja se ovde razlikuju; ako nijedan red
+            # pojedinačno ne pada (istovremeni uvoz je u međuvremenu završio), svi su upisani
+            duplicate = self.find_duplicate(chunk, rows)
+            if duplicate is not None:
+                return duplicate
+
+        product_ids = {
+            name.lower(): product_id for product_id, name in db.session.execute(
+                select(Product.id, Product.name).where(Product.name.in_(names))
+            ).all()
+        }
+        links = [
+            {"product_id": product_ids[name.lower()], "category_id": category_id}
+            for _, categories, name, _ in chunk
+            for category_id in {self.category_ids[c.lower()] for c in categories}
+        ]
+        if links:
+            db.session.execute(insert(ProductCategory), links)
+        self.rows_written += len(rows)
+        if self.progress is not None:
+            self.progress(self.rows_validated, self.rows_written)
+        return None
+
+    def sync_write(self, chunk):
+        # Upisuje nove i izmenjene proizvode iz chunk-a; (linija, ime) ako se ime ponavlja u fajlu
+        names = [name for _, _, name, _ in chunk]
+        stored = {
+            row.name.lower(): row for row in db.session.execute(
+                select(Product.id, Product.name, Product.price, Product.category_names)
+                .where(Product.name.in_(names))
+            ).all()
+        }
+        # sačuvana imena su kanonska, pa se i imena iz fajla prvo svode na njih
+        self.resolve_categories(categories for _, categories, _, _ in chunk)
+        rows = []
+        relink = []
+        for idx, categories, name, price in chunk:
+            key = name.lower()
+            if key in self.seen:
+                return idx, name
+            self.seen.add(key)
+
+            category_names = self.canonical(categories)
+            current = stored.get(key)
+            if current is not None:
+                current_names = current.category_names or []
+                if CatalogImporter.row_hash(current.price, current_names) == CatalogImporter.row_hash(price, category_names):
+                    self.unchanged += 1
+                    continue
+                self.changed += 1
+                if set(current_names) != set(category_names):
+                    relink.append((current.name, categories))
+            else:
+                self.added += 1
+                relink.append((name, categories))
+            rows.append({
+                "name": name, "price": price, "category_names": category_names,
+                "catalog_version": self.version()
+            })
+
+        if rows:
+            stmt = mysql_insert(Product).values(rows)
+            db.session.execute(stmt.on_duplicate_key_update(
+                price=stmt.inserted.price,
+                category_names=stmt.inserted.category_names,
+                catalog_version=stmt.inserted.catalog_version
+            ))
+        if relink:
+            self.sync_links(relink)
+
+        self.rows_written += len(rows)
+        if self.progress is not None:
+            self.progress(self.rows_validated, self.rows_written)
+        return None
+
+    def sync_links(self, relink):
+        # Briše veze kojih više nema i dodaje nove, ostale veze proizvoda se ne diraju
+        self.resolve_categories(categories for _, categories in relink)
+        product_ids = {
+            name.lower(): product_id for product_id, name in db.session.execute(
+                select(Product.id, Product.name).where(Product.name.in_([name for name, _ in relink]))
+            ).all()
+        }
+        wanted = {
+            (product_ids[name.lower()], self.category_ids[c.lower()])
+            for name, categories in relink
+            for c in categories
+        }
+        existing = {
+            (product_id, category_id) for product_id, category_id in db.session.execute(
+                select(ProductCategory.product_id, ProductCategory.category_id)
+                .where(ProductCategory.product_id.in_(list(product_ids.values())))
+            ).all()
+        }
+
+        removed = existing - wanted
+        if removed:
+            db.session.execute(
+                delete(ProductCategory)
+                .where(tuple_(ProductCategory.product_id, ProductCategory.category_id).in_(list(removed)))
+            )
+        added = wanted - existing
+        if added:
+            db.session.execute(
+                insert(ProductCategory),
+                [{"product_id": product_id, "category_id": category_id} for product_id, category_id in added]
+            )
+        # isporučene količine po kategoriji prate promenjene veze
+        CategorySales.relink(added, removed)
+
+    def canonical(self, categories):
+        # Sortirana imena kategorija iz baze, jednom po kategoriji
+        return sorted({self.category_names[self.category_ids[c.lower()]] for c in categories})
+
+    def find_duplicate(self, chunk, rows):
+        # Upisuje redove jedan po jedan; (linija, ime) prvog koji pada, ili None kad su svi upisani
+        for (idx, _, _, _), row in zip(chunk, rows):
+            try:
+                with db.session.begin_nested():
+                    db.session.execute(insert(Product), [row])
+            except IntegrityError:
+                return idx, row["name"]
+        return None
+
+    def resolve_categories(self, category_lists):
+        # Nepoznate kategorije se traže jednim upitom, a nove upisuju jednim INSERT-om
+        missing = {}
+        for categories in category_lists:
+            for cname in categories:
+                if cname.lower() not in self.category_ids:
+                    missing.setdefault(cname.lower(), cname)
+        if not missing:
+            return
+
+        self.load_categories(missing)
+        new = [{"name": cname} for key, cname in missing.items() if key not in self.category_ids]
+        if new:
+            db.session.execute(insert(Category).prefix_with("IGNORE"), new)
+            self.load_categories(missing)
+
+        for key, cname in missing.items():
+            if key not in self.category_ids:
+                category_id, name = db.session.execute(
+                    select(Category.id, Category.name).where(Category.name == cname)
+                ).one()
+                self.category_ids[key] = category_id
+                self.category_names[category_id] = name
+
+    def load_categories(self, names):
+        found = db.session.execute(
+            select(Category.id, Category.name).where(Category.name.in_(list(names.values())))
+        ).all()
+        for category_id, name in found:
+            self.category_ids.setdefault(name.lower(), category_id)
+            self.category_names[category_id] = name
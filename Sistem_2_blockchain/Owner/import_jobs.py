@@ -0,0 +1,136 @@
+import os
+import tempfile
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from sqlalchemy import insert, update
+
+from ORM import db, ImportJob
+from catalog_import import CatalogImporter
+
+
+class ImportJobs:
+    """
+    Asinhroni uvoz kataloga. Otpremljeni CSV se čuva u IMPORT_SPOOL_DIR, zahtev
+    odmah dobija id posla, a radnik ga uvozi istim CatalogImporter-om kao
+    sinhroni /update (sve ili ništa u jednoj transakciji). Napredak se upisuje
+    posebnom konekcijom da bude vidljiv dok transakcija uvoza traje.
+    """
+    app = None
+    executor = None
+    spool_dir = os.getenv("IMPORT_SPOOL_DIR", os.path.join(tempfile.gettempdir(), "catalog_imports"))
+
+    @staticmethod
+    def init_app(app):
+        ImportJobs.app = app
+        ImportJobs.executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv("IMPORT_WORKERS", "2")),
+            thread_name_prefix="importer"
+        )
+
+    @staticmethod
+    def submit(email, f, mode="INSERT"):
+        os.makedirs(ImportJobs.spool_dir, exist_ok=True)
+        path = os.path.join(ImportJobs.spool_dir, f"{uuid.uuid4().hex}.csv")
+        f.save(path)
+        try:
+            with db.engine.begin() as conn:
+                job_id = conn.execute(
+                    insert(ImportJob).values(
+                        email=email, status="QUEUED", mode=mode, path=path,
+                        created_at=datetime.now(timezone.utc)
+                    )
+                ).inserted_primary_key[0]
+        except Exception:
+            os.remove(path)
+            raise
+        ImportJobs.executor.submit(ImportJobs._run, job_id)
+        return job_id
+
+    @staticmethod
+    def resume():
+        # Posle restarta: transakcija prekinutog uvoza je poništena, pa se posao
+        # pokreće ispočetka ako je fajl još na disku
+        with ImportJobs.app.app_context():
+            jobs = ImportJob.query.filter(ImportJob.status.in_(("QUEUED", "RUNNING"))).all()
+            for job in jobs:
+                if os.path.exists(job.path):
+                    job.status = "QUEUED"
+                    job.rows_validated = 0
+                    job.rows_written = 0
+                    db.session.commit()
+                    ImportJobs.executor.submit(ImportJobs._run, job.id)
+                else:
+                    job.status = "FAILED"
+                    job.error = "Import interrupted."
+                    job.finished_at = datetime.now(timezone.utc)
+                    db.session.commit()
+
+    @staticmethod
+    def _update(job_id, **values):
+        with db.engine.begin() as conn:
+            return conn.execute(
+                update(ImportJob).where(ImportJob.id == job_id).values(**values)
+            ).rowcount
+
+    @staticmethod
+    def _run(job_id):
+        with ImportJobs.app.app_context():
+            # posao preuzima samo jedan radnik
+            with db.engine.begin() as conn:
+                claimed = conn.execute(
+                    update(ImportJob)
+                    .where(ImportJob.id == job_id, ImportJob.status == "QUEUED")
+                    .values(status="RUNNING")
+                ).rowcount == 1
+            if not claimed:
+                return
+            job = db.session.get(ImportJob, job_id)
+            path, sync = job.path, job.mode == "SYNC"
+            db.session.rollback()
+
+            importer = CatalogImporter(
+                sync=sync,
+                progress=lambda validated, written: ImportJobs._update(
+                    job_id, rows_validated=validated, rows_written=written
+                )
+            )
+            try:
+                with open(path, "rb") as stream:
+                    error = importer.run(stream)
+            except Exception as e:
+                print(f"Import job {job_id} failed: {e}")
+                db.session.rollback()
+                error = "Import failed."
+
+            if error is None:
+                summary = importer.summary() if sync else {}
+                ImportJobs._update(
+                    job_id, status="DONE", rows_validated=importer.rows_validated,
+                    rows_written=importer.rows_written, finished_at=datetime.now(timezone.utc), **summary
+                )
+            else:
+                # ništa nije upisano, transakcija uvoza je poništena
+                ImportJobs._update(
+                    job_id, status="FAILED", rows_validated=importer.rows_validated, rows_written=0,
+                    error=error, error_line=importer.error_line, finished_at=datetime.now(timezone.utc)
+                )
+            os.remove(path)
+
+    @staticmethod
+    def to_json(job):
+        return {
+            "id": job.id,
+            "status": job.status,
+            "mode": job.mode,
+            "rows_validated": job.rows_validated,
+            "rows_written": job.rows_written,
+            "added": job.added,
+            "changed": job.changed,
+            "unchanged": job.unchanged,
+            "error": job.error,
+            "error_line": job.error_line,
+            "created_at": job.created_at.isoformat() if job.created_at else None,
+            "finished_at": job.finished_at.isoformat() if job.finished_at else None
+        }
@@ -0,0 +1,153 @@
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+from sqlalchemy import select, update
+from sqlalchemy.dialects.mysql import insert
+from web3 import Web3
+
+from blockchain import OrderContract
+from ORM import db, Order, ChainCursor, OrderChainState, ProductSales
+
+
+# topic0 -> (vrsta događaja, da li je iz OrderBook ugovora gde je topic1 id narudžbine)
+EVENTS = {
+    bytes(Web3.keccak(text="Paid(address,uint256)")): ("paid", False),
+    bytes(Web3.keccak(text="CourierAssigned(address)")): ("courier", False),
+    bytes(Web3.keccak(text="DeliveryConfirmed(address,uint256,uint256)")): ("delivered", False),
+    bytes(Web3.keccak(text="Paid(uint256,address,uint256)")): ("paid", True),
+    bytes(Web3.keccak(text="CourierAssigned(uint256,address)")): ("courier", True),
+    bytes(Web3.keccak(text="DeliveryConfirmed(uint256,address,uint256,uint256)")): ("delivered", True),
+}
+
+
+class ChainIndexer:
+    """
+    Prati nove blokove preko eth_getLogs i upisuje Paid / CourierAssigned /
+    DeliveryConfirmed događaje u order_chain_state. Događaji i pomeranje kursora
+    (chain_cursor) idu u istoj transakciji, pa se posle restarta bezbedno
+    nastavlja od poslednjeg obrađenog bloka. Dodela kurira i potvrda isporuke
+    pomeraju i status narudžbine, za transakcije čiji je zahtev vratio "submitted".
+    """
+    name = "order_events"
+    app = None
+    interval = float(os.getenv("INDEXER_INTERVAL", "1"))
+    block_batch = int(os.getenv("INDEXER_BLOCK_BATCH", "500"))
+    start_block = int(os.getenv("INDEXER_START_BLOCK", "0"))
+
+    @staticmethod
+    def start(app):
+        ChainIndexer.app = app
+        thread = threading.Thread(target=ChainIndexer._loop, name="chain-indexer", daemon=True)
+        thread.start()
+        return thread
+
+    @staticmethod
+    def _loop():
+        while True:
+            behind = False
+            try:
+                with ChainIndexer.app.app_context():
+                    behind = ChainIndexer.run_once()
+            except Exception as e:
+                print(f"Chain indexer error: {e}")
+            # dok zaostaje za lancem, obrađuje blokove bez pauze
+            if not behind:
+                time.sleep(ChainIndexer.interval)
+
+    @staticmethod
+    def run_once():
+        now = datetime.now(timezone.utc)
+        locked = (
+            select(ChainCursor.block_number)
+            .where(ChainCursor.name == ChainIndexer.name)
+            .with_for_update()
+        )
+        with db.engine.begin() as conn:
+            conn.execute(
+                insert(ChainCursor).prefix_with("IGNORE").values(
+                    name=ChainIndexer.name, block_number=ChainIndexer.start_block - 1, updated_at=now
+                )
+            )
+            cursor = conn.execute(locked).scalar_one()
+
+            latest = OrderContract.w3.eth.block_number
+            to_block = min(latest, cursor + ChainIndexer.block_batch)
+            if to_block > cursor:
+                logs = OrderContract.w3.eth.get_logs({
+                    "fromBlock": cursor + 1,
+                    "toBlock": to_block,
+                    "topics": [[Web3.to_hex(topic) for topic in EVENTS]]
+                })
+                ChainIndexer._reconcile(ChainIndexer._apply(conn, logs))
+            else:
+                to_block = cursor
+
+            conn.execute(
+                update(ChainCursor)
+                .where(ChainCursor.name == ChainIndexer.name)
+                .values(block_number=to_block, updated_at=now)
+            )
+        return to_block < latest
+
+    @staticmethod
+    def _apply(conn, logs):
+        recorded = []
+        per_order = {}
+        registry = []
+        for log in logs:
+            kind, is_registry = EVENTS[bytes(log["topics"][0])]
+            if is_registry:
+                registry.append((int.from_bytes(log["topics"][1], "big"), kind, log))
+            else:
+                per_order.setdefault(log["address"].lower(), []).append((kind, log))
+
+        # Prihvataju se samo događaji sa adresa naših ugovora
+        if per_order:
+            found = conn.execute(
+                select(Order.id, Order.contract_address)
+                .where(Order.contract_address.in_(list(per_order)))
+                .where(Order.contract_mode != "REGISTRY")
+            ).all()
+            for order_id, address in found:
+                for kind, log in per_order.get(address.lower(), []):
+                    ChainIndexer._record(conn, order_id, kind, log, 1)
+                    recorded.append((order_id, kind))
+
+        if registry:
+            found = dict(conn.execute(
+                select(Order.id, Order.contract_address)
+                .where(Order.id.in_([order_id for order_id, _, _ in registry]))
+                .where(Order.contract_mode == "REGISTRY")
+            ).all())
+            for order_id, kind, log in registry:
+                address = found.get(order_id)
+                if address and address.lower() == log["address"].lower():
+                    ChainIndexer._record(conn, order_id, kind, log, 2)
+                    recorded.append((order_id, kind))
+        return recorded
+
+    @staticmethod
+    def _reconcile(recorded):
+        # Prelazi su uslovni pa je svejedno da li ih je ruta već uradila; upisuju se pre
+        # pomeranja kursora, tako da se posle pada ponovo primene na iste događaje
+        moves = {"courier": ("CREATED", "PENDING"), "delivered": ("PENDING", "COMPLETE")}
+        for kind in ("courier", "delivered"):
+            for order_id in sorted({order_id for order_id, done in recorded if done == kind}):
+                ProductSales.move(order_id, *moves[kind])
+        db.session.commit()
+
+    @staticmethod
+    def _record(conn, order_id, kind, log, topic_offset):
+        block = log["blockNumber"]
+        if kind == "paid":
+            values = {"paid": True, "paid_amount": int.from_bytes(log["data"][:32], "big"), "paid_block": block}
+        elif kind == "courier":
+            courier = Web3.to_checksum_address(log["topics"][topic_offset][-20:])
+            values = {"courier": courier, "courier_block": block}
+        else:
+            values = {"delivered": True, "delivered_block": block}
+
+        stmt = insert(OrderChainState).values(order_id=order_id, **values)
+        conn.execute(stmt.on_duplicate_key_update(**values))
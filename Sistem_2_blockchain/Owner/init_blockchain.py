@@ -1,7 +1,8 @@
+import os
 from web3 import Web3, HTTPProvider
 
 def init_account():
-    web3 = Web3(HTTPProvider("http://ganache:8545"))
+    web3 = Web3(HTTPProvider(os.getenv("WEB3_PROVIDER", "http://ganache:8545")))
     accounts = web3.eth.accounts
 
     if web3.eth.get_balance(accounts[-1]) == 0:
@@ -1,13 +1,14 @@
 import os
-import csv
-import io
-from decimal import Decimal, InvalidOperation
+import click
 from flask import Flask, request, jsonify, g
-from sqlalchemy import func, case
 from dotenv import load_dotenv
-from sqlalchemy.exc import IntegrityError
-from ORM import db, Product, Category, ProductCategory, Order, OrderProduct
+from ORM import db, db_ready, engine_options, pool_stats, read_replica, Product, ProductSales, CategorySales, ImportJob
 from JWT import JWT
+from blockchain import OrderContract, ChainBreaker, ChainUnavailable, ReceiptTracker
+from indexer import ChainIndexer
+from catalog_import import CatalogImporter
+from import_jobs import ImportJobs
+from cache import StaleWhileRevalidate
 
 import jwt
 
@@ -22,9 +23,30 @@ db_name = "prodavnica"
 DB_URI  = f"mysql+pymysql://{db_user}:{db_pass}@{db_addr}/{db_name}"
 
 app.config["SQLALCHEMY_DATABASE_URI"] = DB_URI
+
+# Opciona replika za rute koje samo čitaju (read_replica)
+db_replica_addr = os.getenv("DB_REPLICA_ADDR", "")
+if db_replica_addr:
+    app.config["SQLALCHEMY_BINDS"] = {
+        "replica": f"mysql+pymysql://{db_user}:{db_pass}@{db_replica_addr}/{db_name}"
+    }
 app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options()
 
 db.init_app(app)
+ImportJobs.init_app(app)
+
+# Rang kategorija za /category_statistics; posle ttl se vraća stari rang dok se osvežava u pozadini
+category_ranking = StaleWhileRevalidate(
+    ttl=float(os.getenv("CATEGORY_STATS_TTL", "5")),
+    max_stale=float(os.getenv("CATEGORY_STATS_MAX_STALE", "300"))
+)
+
+
+def load_category_ranking():
+    # Poziva se i iz pozadinske niti, pa ima svoj app context
+    with app.app_context():
+        return read_replica(CategorySales.ranking)()
 
 
 
@@ -67,77 +89,59 @@ def update_products():
     if f is None:
         return jsonify({"message": "Field file is missing."}), 400
 
-    # Čitamo CSV
-    try:
-        content = f.read().decode("utf-8")
-    except Exception:
-        content = ""
-    rows = list(csv.reader(io.StringIO(content), delimiter=","))
-
-    # 2) Provera broja kolona
-    for idx, row in enumerate(rows):
-        if len(row) != 3:
-            return jsonify({"message": f"Incorrect number of values on line {idx}."}), 400
-
-    # 3) Provera cene
-    parsed = []
-    for idx, (cat_str, name, price_str) in enumerate(rows):
-        try:
-            price = Decimal(price_str)
-        except Exception:
-            return jsonify({"message": f"Incorrect price on line {idx}."}), 400
-        if price <= 0:
-            return jsonify({"message": f"Incorrect price on line {idx}."}), 400
-        categories = [c.strip() for c in (cat_str.split("|") if cat_str else []) if c.strip()]
-        parsed.append((categories, name.strip(), price))
-    try:
-        for categories, name, price in parsed:
-            current_name = name
-            prod = Product(name=name, price=price)
-            db.session.add(prod)
-            db.session.flush()
+    # mode=sync: postojeći proizvodi se ažuriraju umesto da budu greška
+    mode = request.args.get("mode", "insert")
+    if mode not in ("insert", "sync"):
+        return jsonify({"message": "Invalid mode."}), 400
 
-            for cname in categories:
-                cat = db.session.query(Category).filter_by(name=cname).first()
-                if not cat:
-                    cat = Category(name=cname)
-                    db.session.add(cat)
-                    db.session.flush()
+    # Veliki fajlovi: uvoz u pozadini, napredak se prati preko /import_status
+    if request.args.get("async") == "1":
+        job_id = ImportJobs.submit(val["email"], f, mode.upper())
+        return jsonify({"job_id": job_id}), 202
 
-                db.session.add(ProductCategory(product_id=prod.id, category_id=cat.id))
-                db.session.flush()
+    # 2) i 3) Broj kolona i cene se proveravaju u istom prolazu kroz fajl u kome se upisuje
+    importer = CatalogImporter(sync=mode == "sync")
+    error = importer.run(f.stream)
+    if error is not None:
+        return jsonify({"message": error}), 400
 
-        db.session.commit()
-        return "", 200
+    if importer.sync:
+        return jsonify(importer.summary()), 200
+    return "", 200
 
-    except IntegrityError:
-        db.session.rollback()
-        return jsonify({"message": f"Product {current_name} already exists."}), 400
 
-    return "", 200
+@app.route("/import_status", methods=["GET"])
+def import_status():
+    ok, val = auth_check(required_role="owner")
+    if not ok:
+        return val
+
+    job_id = request.args.get("id", "")
+    if not job_id.isdigit():
+        return jsonify({"message": "Invalid job id."}), 400
+    job = db.session.get(ImportJob, int(job_id))
+    if job is None:
+        return jsonify({"message": "Import job not found."}), 404
+    return jsonify(ImportJobs.to_json(job)), 200
 
 
 @app.route("/product_statistics", methods=["GET"])
+@read_replica
 def product_statistics():
     ok, val = auth_check(required_role="owner")
     if not ok:
         return val
 
-    # query sumira prodato i čekajuće po proizvodu
-    # Query za statistiku proizvoda
+    # Prodato i čekajuće po proizvodu se čita iz zbirne tabele product_sales
+    # (čekajuće su narudžbine koje nisu COMPLETE, tj. CREATED i PENDING)
     q = (
         db.session.query(
             Product.name,
-            func.sum(
-                case((Order.status == "COMPLETE", OrderProduct.quantity), else_=0)
-            ).label("sold"),
-            func.sum(
-                case((Order.status != "COMPLETE", OrderProduct.quantity), else_=0)
-            ).label("waiting"),
+            ProductSales.sold,
+            (ProductSales.waiting + ProductSales.in_transit).label("waiting"),
         )
-        .join(OrderProduct)
-        .join(Order)
-        .group_by(Product.id)
+        .join(ProductSales, ProductSales.product_id == Product.id)
+        .order_by(Product.id)
     )
 
     # Pravimo listu JSON objekata i izbacujemo proizvode sa 0 količine
@@ -156,24 +160,83 @@ def category_statistics():
     ok, val = auth_check(required_role="owner")
     if not ok:
         return val
-    delivered = func.coalesce(
-        func.sum(case((Order.status == "COMPLETE", OrderProduct.quantity), else_=0)), 0
-    ).label("delivered")
+    # Rang se čita iz zbirne tabele category_sales, preko keša
+    names = category_ranking.get(load_category_ranking)
+    return jsonify({"statistics": names}), 200
 
-    q = (
-        db.session.query(Category.name, delivered)
-        .outerjoin(ProductCategory, ProductCategory.category_id == Category.id)
-        .outerjoin(Product, Product.id == ProductCategory.product_id)
-        .outerjoin(OrderProduct, OrderProduct.product_id == Product.id)
-        .outerjoin(Order, Order.id == OrderProduct.order_id)
-        .group_by(Category.id)
-        .order_by(delivered.desc(), Category.name.asc())
-    )
 
-    names = [name for name, _ in q.all()]
-    return jsonify({"statistics": names}), 200
+@app.errorhandler(ChainUnavailable)
+def chain_unavailable(e):
+    # Prekidač je otvoren ili je istekao rok operacije: brz odgovor umesto visećeg radnika
+    return jsonify({"message": str(e)}), 503
 
 
-if __name__ == "__main__":
+@app.route("/ready", methods=["GET"])
+def ready():
+    # Spremnost servisa: dostupnost baze i blockchain čvora
+    checks = {"db": db_ready(), "node": OrderContract.node_ready()}
+    ok = all(checks.values())
+    return jsonify({"ready": ok, **checks}), 200 if ok else 503
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    return jsonify({
+        "chain_breaker": ChainBreaker.stats(),
+        "db_pool": pool_stats(),
+        "receipts_pending": ReceiptTracker.pending_count(),
+        "caches": OrderContract.cache_stats(),
+        "category_statistics": category_ranking.stats()
+    }), 200
+
+
+@app.cli.command("rebuild-sales")
+def rebuild_sales():
+    """Ponovo računa product_sales i category_sales iz order_product i order."""
+    ProductSales.rebuild()
+    CategorySales.rebuild()
+    print("product_sales and category_sales rebuilt.")
+
+
+@app.cli.command("check-sales")
+def check_sales():
+    """Poredi product_sales i category_sales sa zbirom iz order_product i order."""
+    mismatches = ProductSales.check()
+    for product_id, have, want in mismatches:
+        print(f"product {product_id}: rollup (waiting, in_transit, sold)={have}, expected={want}")
+    category_mismatches = CategorySales.check()
+    for category_id, have, want in category_mismatches:
+        print(f"category {category_id}: rollup delivered={have}, expected={want}")
+    if mismatches or category_mismatches:
+        raise SystemExit(1)
+    print("product_sales and category_sales are consistent.")
+
+
+DEBUG = os.getenv("FLASK_DEBUG", "1") == "1"
 
-    app.run(host="0.0.0.0", port=5001, debug=True)
+
+def serves_requests():
+    # flask CLI komande (rebuild-sales, check-sales) ne služe zahteve
+    if click.get_current_context(silent=True) is not None and os.environ.get("FLASK_RUN_FROM_CLI") != "true":
+        return False
+    # Sa reloader-om (python owner.py u debug režimu) roditeljski proces samo prati
+    # izmene fajlova, a zahteve služi dete sa WERKZEUG_RUN_MAIN; bez reloader-a
+    # (WSGI server, debug=False) zahteve služi sam proces
+    return not (__name__ == "__main__" and DEBUG) or os.environ.get("WERKZEUG_RUN_MAIN") == "true"
+
+
+def start_background():
+    # Indekser događaja sa lanca radi samo u procesu koji služi zahteve
+    if os.getenv("CHAIN_INDEXER", "1") == "1":
+        ChainIndexer.start(app)
+    # uvozi prekinuti restartom se nastavljaju iz sačuvanih CSV fajlova
+    ImportJobs.resume()
+
+
+# BACKGROUND_JOBS=0 za skripte i testove koji samo importuju app
+if serves_requests() and os.getenv("BACKGROUND_JOBS", "1") == "1":
+    start_background()
+
+
+if __name__ == "__main__":
+    app.run(host="0.0.0.0", port=5001, debug=DEBUG)
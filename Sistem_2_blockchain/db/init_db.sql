@@ -6,7 +6,10 @@ USE prodavnica;
 CREATE TABLE IF NOT EXISTS product (
     id INT AUTO_INCREMENT PRIMARY KEY,
     name VARCHAR(100) NOT NULL UNIQUE,
-    price DECIMAL(10,2) NOT NULL
+    price DECIMAL(10,2) NOT NULL,
+    category_names JSON NULL,
+    catalog_version BIGINT NOT NULL DEFAULT 0,
+    INDEX idx_product_catalog_version (catalog_version)
 );
 
 -- Tabela Category
@@ -30,7 +33,15 @@ CREATE TABLE IF NOT EXISTS `order` (
     email VARCHAR(150) NOT NULL,
     status ENUM('CREATED','PENDING','COMPLETE') NOT NULL DEFAULT 'CREATED',
     timestamp DATETIME NOT NULL,
-    contract_address VARCHAR(150) NOT NULL
+    contract_address VARCHAR(150) NULL,
+    deploy_status ENUM('DEPLOYING','DEPLOYED','FAILED') NOT NULL DEFAULT 'DEPLOYED',
+    deploy_tx_hash VARCHAR(80) NULL,
+    deploy_error VARCHAR(255) NULL,
+    contract_mode ENUM('PER_ORDER','CLONE','REGISTRY') NOT NULL DEFAULT 'PER_ORDER',
+    total_price DECIMAL(12,2) NULL,
+    INDEX idx_order_contract_address (contract_address),
+    INDEX idx_order_email_timestamp (email, timestamp, id),
+    INDEX idx_order_to_deliver (status, deploy_status, id)
 );
 
 -- Tabela OrderProduct (many-to-many sa količinom)
@@ -38,8 +49,99 @@ CREATE TABLE IF NOT EXISTS order_product (
     order_id INT NOT NULL,
     product_id INT NOT NULL,
     quantity INT NOT NULL,
+    unit_price DECIMAL(10,2) NULL,
+    product_name VARCHAR(100) NULL,
+    category_names JSON NULL,
     PRIMARY KEY (order_id, product_id),
     FOREIGN KEY (order_id) REFERENCES `order`(id) ON DELETE CASCADE,
     FOREIGN KEY (product_id) REFERENCES product(id) ON DELETE CASCADE
 );
  
+
+-- Tabela ProductSales (zbirne količine po proizvodu i statusu narudžbine)
+CREATE TABLE IF NOT EXISTS product_sales (
+    product_id INT PRIMARY KEY,
+    waiting BIGINT NOT NULL DEFAULT 0,
+    in_transit BIGINT NOT NULL DEFAULT 0,
+    sold BIGINT NOT NULL DEFAULT 0,
+    FOREIGN KEY (product_id) REFERENCES product(id) ON DELETE CASCADE
+);
+
+-- Tabela CategorySales (isporučene količine po kategoriji)
+CREATE TABLE IF NOT EXISTS category_sales (
+    category_id INT PRIMARY KEY,
+    delivered BIGINT NOT NULL DEFAULT 0,
+    FOREIGN KEY (category_id) REFERENCES category(id) ON DELETE CASCADE
+);
+
+-- Tabela IdempotencyKey (odgovori POST /order po Idempotency-Key zaglavlju)
+CREATE TABLE IF NOT EXISTS idempotency_key (
+    email VARCHAR(150) NOT NULL,
+    idempotency_key VARCHAR(128) NOT NULL,
+    request_hash CHAR(64) NOT NULL,
+    status ENUM('PENDING','DONE') NOT NULL DEFAULT 'PENDING',
+    response_status INT NULL,
+    response_body TEXT NULL,
+    expires_at DATETIME NOT NULL,
+    PRIMARY KEY (email, idempotency_key),
+    INDEX idx_idempotency_key_expires_at (expires_at)
+);
+
+-- Tabela NonceReservation (sledeći nonce owner naloga, deli se između servisa)
+CREATE TABLE IF NOT EXISTS nonce_reservation (
+    account VARCHAR(42) PRIMARY KEY,
+    next_nonce BIGINT NOT NULL DEFAULT 0
+);
+
+-- Tabela DeployedContract (ugovori koji se deploy-uju jednom, npr. OrderBook)
+CREATE TABLE IF NOT EXISTS deployed_contract (
+    name VARCHAR(50) PRIMARY KEY,
+    address VARCHAR(42) NULL
+);
+
+-- Tabela ChainCursor (poslednji blok koji je indekser događaja obradio)
+CREATE TABLE IF NOT EXISTS chain_cursor (
+    name VARCHAR(50) PRIMARY KEY,
+    block_number BIGINT NOT NULL,
+    updated_at DATETIME NOT NULL
+);
+
+-- Tabela OrderChainState (Paid / CourierAssigned / DeliveryConfirmed po narudžbini)
+CREATE TABLE IF NOT EXISTS order_chain_state (
+    order_id INT PRIMARY KEY,
+    paid BOOLEAN NOT NULL DEFAULT FALSE,
+    paid_amount DECIMAL(38,0) NULL,
+    paid_block BIGINT NULL,
+    courier VARCHAR(42) NULL,
+    courier_block BIGINT NULL,
+    delivered BOOLEAN NOT NULL DEFAULT FALSE,
+    delivered_block BIGINT NULL,
+    FOREIGN KEY (order_id) REFERENCES `order`(id) ON DELETE CASCADE
+);
+
+-- Tabela CatalogVersion (verzija kataloga, povećava je /update)
+CREATE TABLE IF NOT EXISTS catalog_version (
+    name VARCHAR(50) PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0
+);
+
+INSERT IGNORE INTO catalog_version (name, version) VALUES ('catalog', 0);
+
+-- Tabela ImportJob (asinhroni uvoz kataloga, owner /update?async=1)
+CREATE TABLE IF NOT EXISTS import_job (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    email VARCHAR(150) NOT NULL,
+    status ENUM('QUEUED','RUNNING','DONE','FAILED') NOT NULL DEFAULT 'QUEUED',
+    path VARCHAR(255) NOT NULL,
+    rows_validated INT NOT NULL DEFAULT 0,
+    rows_written INT NOT NULL DEFAULT 0,
+    mode ENUM('INSERT','SYNC') NOT NULL DEFAULT 'INSERT',
+    added INT NULL,
+    changed INT NULL,
+    unchanged INT NULL,
+    error VARCHAR(255) NULL,
+    error_line INT NULL,
+    created_at DATETIME NOT NULL,
+    finished_at DATETIME NULL,
+    INDEX idx_import_job_status (status)
+);
@@ -0,0 +1,8 @@
+-- Asinhroni deploy ugovora: narudžbina se upisuje pre nego što ugovor postoji
+USE prodavnica;
+
+ALTER TABLE `order`
+    MODIFY contract_address VARCHAR(150) NULL,
+    ADD COLUMN deploy_status ENUM('DEPLOYING','DEPLOYED','FAILED') NOT NULL DEFAULT 'DEPLOYED',
+    ADD COLUMN deploy_tx_hash VARCHAR(80) NULL,
+    ADD COLUMN deploy_error VARCHAR(255) NULL;
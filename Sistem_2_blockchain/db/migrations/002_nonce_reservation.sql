@@ -0,0 +1,7 @@
+-- Zajednički brojač nonce-a za owner nalog
+USE prodavnica;
+
+CREATE TABLE IF NOT EXISTS nonce_reservation (
+    account VARCHAR(42) PRIMARY KEY,
+    next_nonce BIGINT NOT NULL DEFAULT 0
+);
@@ -0,0 +1,10 @@
+-- Registry režim: jedan OrderBook ugovor umesto ugovora po narudžbini
+USE prodavnica;
+
+ALTER TABLE `order`
+    ADD COLUMN contract_mode ENUM('PER_ORDER','REGISTRY') NOT NULL DEFAULT 'PER_ORDER';
+
+CREATE TABLE IF NOT EXISTS deployed_contract (
+    name VARCHAR(50) PRIMARY KEY,
+    address VARCHAR(42) NULL
+);
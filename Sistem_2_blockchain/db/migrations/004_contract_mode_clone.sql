@@ -0,0 +1,5 @@
+-- Clone režim: narudžbina kao EIP-1167 proxy ka zajedničkoj implementaciji
+USE prodavnica;
+
+ALTER TABLE `order`
+    MODIFY contract_mode ENUM('PER_ORDER','CLONE','REGISTRY') NOT NULL DEFAULT 'PER_ORDER';
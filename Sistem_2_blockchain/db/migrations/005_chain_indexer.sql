@@ -0,0 +1,23 @@
+-- Indekser događaja sa lanca: kursor blokova i stanje narudžbina
+USE prodavnica;
+
+ALTER TABLE `order`
+    ADD INDEX idx_order_contract_address (contract_address);
+
+CREATE TABLE IF NOT EXISTS chain_cursor (
+    name VARCHAR(50) PRIMARY KEY,
+    block_number BIGINT NOT NULL,
+    updated_at DATETIME NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS order_chain_state (
+    order_id INT PRIMARY KEY,
+    paid BOOLEAN NOT NULL DEFAULT FALSE,
+    paid_amount DECIMAL(38,0) NULL,
+    paid_block BIGINT NULL,
+    courier VARCHAR(42) NULL,
+    courier_block BIGINT NULL,
+    delivered BOOLEAN NOT NULL DEFAULT FALSE,
+    delivered_block BIGINT NULL,
+    FOREIGN KEY (order_id) REFERENCES `order`(id) ON DELETE CASCADE
+);
@@ -0,0 +1,6 @@
+-- Indeksi za keyset straničenje /status i /orders_to_deliver
+USE prodavnica;
+
+ALTER TABLE `order`
+    ADD INDEX idx_order_email_timestamp (email, timestamp, id),
+    ADD INDEX idx_order_to_deliver (status, deploy_status, id);
@@ -0,0 +1,9 @@
+-- Verzija kataloga za invalidaciju keša pretrage
+USE prodavnica;
+
+CREATE TABLE IF NOT EXISTS catalog_version (
+    name VARCHAR(50) PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0
+);
+
+INSERT IGNORE INTO catalog_version (name, version) VALUES ('catalog', 0);
@@ -0,0 +1,14 @@
+-- Idempotency-Key za POST /order
+USE prodavnica;
+
+CREATE TABLE IF NOT EXISTS idempotency_key (
+    email VARCHAR(150) NOT NULL,
+    idempotency_key VARCHAR(128) NOT NULL,
+    request_hash CHAR(64) NOT NULL,
+    status ENUM('PENDING','DONE') NOT NULL DEFAULT 'PENDING',
+    response_status INT NULL,
+    response_body TEXT NULL,
+    expires_at DATETIME NOT NULL,
+    PRIMARY KEY (email, idempotency_key),
+    INDEX idx_idempotency_key_expires_at (expires_at)
+);
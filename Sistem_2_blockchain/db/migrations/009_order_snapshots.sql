@@ -0,0 +1,31 @@
+-- Ukupna cena narudžbine i snimak proizvoda po stavci
+USE prodavnica;
+
+ALTER TABLE `order`
+    ADD COLUMN total_price DECIMAL(12,2) NULL;
+
+ALTER TABLE order_product
+    ADD COLUMN unit_price DECIMAL(10,2) NULL,
+    ADD COLUMN product_name VARCHAR(100) NULL,
+    ADD COLUMN category_names JSON NULL;
+
+-- Postojeće stavke dobijaju trenutne podatke proizvoda (istorija cena ne postoji)
+UPDATE order_product op
+JOIN product p ON p.id = op.product_id
+SET op.unit_price = p.price,
+    op.product_name = p.name,
+    op.category_names = COALESCE((
+        SELECT JSON_ARRAYAGG(c.name)
+        FROM product_category pc
+        JOIN category c ON c.id = pc.category_id
+        WHERE pc.product_id = op.product_id
+    ), JSON_ARRAY())
+WHERE op.unit_price IS NULL;
+
+UPDATE `order` o
+SET o.total_price = (
+    SELECT COALESCE(SUM(op.unit_price * op.quantity), 0)
+    FROM order_product op
+    WHERE op.order_id = o.id
+)
+WHERE o.total_price IS NULL;
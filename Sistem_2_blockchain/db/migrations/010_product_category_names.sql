@@ -0,0 +1,16 @@
+-- Sortirana imena kategorija po proizvodu (projekcija product_category)
+USE prodavnica;
+
+SET SESSION group_concat_max_len = 1048576;
+
+ALTER TABLE product
+    ADD COLUMN category_names JSON NULL;
+
+UPDATE product p
+SET p.category_names = (
+    SELECT CAST(CONCAT('[', COALESCE(GROUP_CONCAT(JSON_QUOTE(c.name) ORDER BY c.name COLLATE utf8mb4_bin SEPARATOR ','), ''), ']') AS JSON)
+    FROM product_category pc
+    JOIN category c ON c.id = pc.category_id
+    WHERE pc.product_id = p.id
+)
+WHERE p.category_names IS NULL;
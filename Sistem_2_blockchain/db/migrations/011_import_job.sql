@@ -0,0 +1,16 @@
+-- Asinhroni uvoz kataloga (owner /update?async=1)
+USE prodavnica;
+
+CREATE TABLE IF NOT EXISTS import_job (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    email VARCHAR(150) NOT NULL,
+    status ENUM('QUEUED','RUNNING','DONE','FAILED') NOT NULL DEFAULT 'QUEUED',
+    path VARCHAR(255) NOT NULL,
+    rows_validated INT NOT NULL DEFAULT 0,
+    rows_written INT NOT NULL DEFAULT 0,
+    error VARCHAR(255) NULL,
+    error_line INT NULL,
+    created_at DATETIME NOT NULL,
+    finished_at DATETIME NULL,
+    INDEX idx_import_job_status (status)
+);
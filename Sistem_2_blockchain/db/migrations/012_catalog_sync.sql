@@ -0,0 +1,12 @@
+-- Sync režim za /update: verzija izmene po proizvodu i izveštaj u import_job
+USE prodavnica;
+
+ALTER TABLE product
+    ADD COLUMN catalog_version BIGINT NOT NULL DEFAULT 0,
+    ADD INDEX idx_product_catalog_version (catalog_version);
+
+ALTER TABLE import_job
+    ADD COLUMN mode ENUM('INSERT','SYNC') NOT NULL DEFAULT 'INSERT' AFTER rows_written,
+    ADD COLUMN added INT NULL AFTER mode,
+    ADD COLUMN changed INT NULL AFTER added,
+    ADD COLUMN unchanged INT NULL AFTER changed;
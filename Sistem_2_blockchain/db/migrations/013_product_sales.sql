@@ -0,0 +1,23 @@
+-- Zbirne količine po proizvodu za /product_statistics
+USE prodavnica;
+
+CREATE TABLE IF NOT EXISTS product_sales (
+    product_id INT PRIMARY KEY,
+    waiting BIGINT NOT NULL DEFAULT 0,
+    in_transit BIGINT NOT NULL DEFAULT 0,
+    sold BIGINT NOT NULL DEFAULT 0,
+    FOREIGN KEY (product_id) REFERENCES product(id) ON DELETE CASCADE
+);
+
+INSERT INTO product_sales (product_id, waiting, in_transit, sold)
+SELECT op.product_id,
+       SUM(CASE WHEN o.status = 'CREATED' THEN op.quantity ELSE 0 END),
+       SUM(CASE WHEN o.status = 'PENDING' THEN op.quantity ELSE 0 END),
+       SUM(CASE WHEN o.status = 'COMPLETE' THEN op.quantity ELSE 0 END)
+FROM order_product op
+JOIN `order` o ON o.id = op.order_id
+GROUP BY op.product_id
+ON DUPLICATE KEY UPDATE
+    waiting = VALUES(waiting),
+    in_transit = VALUES(in_transit),
+    sold = VALUES(sold);
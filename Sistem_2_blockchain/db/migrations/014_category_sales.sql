@@ -0,0 +1,17 @@
+-- Isporučene količine po kategoriji za /category_statistics
+USE prodavnica;
+
+CREATE TABLE IF NOT EXISTS category_sales (
+    category_id INT PRIMARY KEY,
+    delivered BIGINT NOT NULL DEFAULT 0,
+    FOREIGN KEY (category_id) REFERENCES category(id) ON DELETE CASCADE
+);
+
+INSERT INTO category_sales (category_id, delivered)
+SELECT pc.category_id,
+       SUM(CASE WHEN o.status = 'COMPLETE' THEN op.quantity ELSE 0 END)
+FROM product_category pc
+JOIN order_product op ON op.product_id = pc.product_id
+JOIN `order` o ON o.id = op.order_id
+GROUP BY pc.category_id
+ON DUPLICATE KEY UPDATE delivered = VALUES(delivered);
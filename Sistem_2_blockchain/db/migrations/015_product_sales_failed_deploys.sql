@@ -0,0 +1,12 @@
+-- product_sales ne računa narudžbine čiji deploy nije uspeo (013 ih je uračunao u waiting)
+USE prodavnica;
+
+UPDATE product_sales ps
+JOIN (
+    SELECT op.product_id, SUM(op.quantity) AS quantity
+    FROM order_product op
+    JOIN `order` o ON o.id = op.order_id
+    WHERE o.deploy_status = 'FAILED' AND o.status = 'CREATED'
+    GROUP BY op.product_id
+) failed ON failed.product_id = ps.product_id
+SET ps.waiting = ps.waiting - failed.quantity;
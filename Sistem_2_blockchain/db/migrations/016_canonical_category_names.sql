@@ -0,0 +1,27 @@
+-- category_names sa kanonskim imenima kategorija i sortirani snimci stavki narudžbina
+USE prodavnica;
+
+SET SESSION group_concat_max_len = 1048576;
+
+-- /update je upisivao imena kako su napisana u CSV-u (i varijante velikih/malih slova);
+-- nova verzija kataloga poništava keševi pretrage i ponovo učitava proizvode u indeks
+UPDATE catalog_version SET version = version + 1 WHERE name = 'catalog';
+SET @catalog_version = (SELECT version FROM catalog_version WHERE name = 'catalog');
+
+UPDATE product p
+SET p.category_names = (
+    SELECT CAST(CONCAT('[', COALESCE(GROUP_CONCAT(JSON_QUOTE(c.name) ORDER BY c.name COLLATE utf8mb4_bin SEPARATOR ','), ''), ']') AS JSON)
+    FROM product_category pc
+    JOIN category c ON c.id = pc.category_id
+    WHERE pc.product_id = p.id
+),
+    p.catalog_version = @catalog_version;
+
+-- 009 je snimke popunio sa JSON_ARRAYAGG, čiji redosled nije definisan; sadržaj snimka
+-- se ne menja, samo se sortira kao product.category_names
+UPDATE order_product op
+SET op.category_names = (
+    SELECT CAST(CONCAT('[', COALESCE(GROUP_CONCAT(JSON_QUOTE(jt.name) ORDER BY jt.name COLLATE utf8mb4_bin SEPARATOR ','), ''), ']') AS JSON)
+    FROM JSON_TABLE(op.category_names, '$[*]' COLUMNS (name VARCHAR(255) PATH '$')) jt
+)
+WHERE op.category_names IS NOT NULL;